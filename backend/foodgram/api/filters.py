@@ -1,20 +1,48 @@
-from django.db.models import Exists, OuterRef
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
 from django_filters import rest_framework as filters
 
-from app.models import Favorite, Recipe, ShoppingCart
+from app.catalogue_cache import get_tag_ids_by_slug
+from app.constants import RECIPE_SEARCH_CONFIG
+from app.models import Favorite, Recipe, RecipeTag, ShoppingCart
+
+TAGS_MATCH_CHOICES = (('any', 'Любой из тегов'), ('all', 'Все теги'))
+RECIPE_ORDERING_CHOICES = (('popular', 'Сначала популярные'),)
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.CharFilter(method='filter_by_tags')
+    tags_match = filters.ChoiceFilter(choices=TAGS_MATCH_CHOICES,
+                                      method='filter_tags_match')
     is_favorited = filters.BooleanFilter(method='filter_by_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='search_recipes')
+    ordering = filters.ChoiceFilter(choices=RECIPE_ORDERING_CHOICES,
+                                    method='order_recipes')
 
     def filter_by_tags(self, queryset, name, value):
-        tag_slugs = self.data.getlist('tags')
-        if tag_slugs:
-            return queryset.filter(tags__slug__in=tag_slugs).distinct()
+        tag_slugs = set(self.data.getlist('tags'))
+        if not tag_slugs:
+            return queryset
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        tag_ids = [tag_ids_by_slug[slug] for slug in tag_slugs
+                   if slug in tag_ids_by_slug]
+        if self.data.get('tags_match') == 'all':
+            if len(tag_ids) != len(tag_slugs):
+                return queryset.none()
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                    recipe=OuterRef('pk'), tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
+    def filter_tags_match(self, queryset, name, value):
         return queryset
 
     def filter_by_favorited(self, queryset, name, value):
@@ -33,6 +61,28 @@ class RecipeFilter(filters.FilterSet):
                                                    recipe=OuterRef('pk'))))
         return queryset
 
+    def search_recipes(self, queryset, name, value):
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(value, config=RECIPE_SEARCH_CONFIG,
+                                search_type='websearch')
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query))
+        else:
+            terms = value.split()
+            for term in terms:
+                queryset = queryset.filter(Q(name__iregex=re.escape(term))
+                                           | Q(text__iregex=re.escape(term)))
+            queryset = queryset.annotate(search_rank=sum(
+                (Case(When(name__iregex=re.escape(term), then=Value(1)),
+                      default=Value(0)) for term in terms),
+                Value(0)))
+        return queryset.order_by('-search_rank', *Recipe._meta.ordering, 'id')
+
+    def order_recipes(self, queryset, name, value):
+        return queryset.order_by('-favorites_count',
+                                 *Recipe._meta.ordering, 'id')
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_match', 'is_favorited',
+                  'is_in_shopping_cart', 'search', 'ordering')
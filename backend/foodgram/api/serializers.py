@@ -1,12 +1,20 @@
-import base64
+import os
 import uuid
+from collections.abc import Mapping
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
-from app.constants import DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE
+from app.constants import (AVATAR_RENDITIONS, BULK_RECIPES_MAX_COUNT,
+                           PANTRY_MAX_INGREDIENTS, RECIPE_IMAGE_RENDITIONS)
 from app.models import Ingredient, Recipe, RecipeIngredient, Subscription, Tag
+from app.pantry_index import pantry_index
+from app.shopping_list import rebuild_shopping_lists
+from .uploads import decode_base64_image
 
 User = get_user_model()
 
@@ -14,16 +22,85 @@ User = get_user_model()
 class Base64ImageField(serializers.ImageField):
 
     def to_internal_value(self, data):
-        if data.startswith('data:image'):
-            format_, imgstr = data.split(';base64,')
-            ext = format_.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+        if isinstance(data, str) and data.startswith('data:'):
+            data = decode_base64_image(data)
         return super().to_internal_value(data)
 
 
+class ImageRenditionsField(serializers.Field):
+
+    def __init__(self, renditions, **kwargs):
+        self.renditions = renditions
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        stored = getattr(value.instance, f'{value.field.name}_renditions')
+        if not stored or stored.get('source') != value.name:
+            stored = {}
+        request = self.context.get('request')
+        urls = {}
+        for name in self.renditions:
+            url = value.storage.url(stored.get(name, value.name))
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, (list, tuple)):
+            self.child_relation.resolve(data)
+        return super().to_internal_value(data)
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    resolved = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool) or data is None:
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def resolve(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, DjangoValidationError,
+                    serializers.ValidationError):
+                continue
+        self.resolved = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.resolved is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.resolved:
+            self.fail('does_not_exist', pk_value=data)
+        return self.resolved[pk]
+
+
 class FoodgramUserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.ImageField()
+    avatar_renditions = ImageRenditionsField(AVATAR_RENDITIONS,
+                                             source='avatar')
 
     class Meta:
         model = User
@@ -33,12 +110,15 @@ class FoodgramUserSerializer(serializers.ModelSerializer):
                   'first_name',
                   'last_name',
                   'is_subscribed',
-                  'avatar')
+                  'avatar',
+                  'avatar_renditions')
 
     def get_is_subscribed(self, obj):
         request = self.context['request']
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return request.user.subscriptions.filter(author=obj).exists()
 
 
@@ -51,15 +131,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(source='author.last_name',
                                       read_only=True)
     avatar = serializers.ImageField(source='author.avatar', read_only=True)
+    avatar_renditions = ImageRenditionsField(AVATAR_RENDITIONS,
+                                             source='author.avatar')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='author.recipes.count',
+    recipes_count = serializers.IntegerField(source='author.recipes_count',
                                              read_only=True)
 
     class Meta:
         model = Subscription
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'avatar', 'recipes', 'recipes_count')
+                  'is_subscribed', 'avatar', 'avatar_renditions', 'recipes',
+                  'recipes_count')
 
     def validate(self, data):
         author = self.context['author']
@@ -84,51 +167,29 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         request = self.context['request']
         if not request or request.user.is_anonymous:
             return False
-        return request.user.subscriptions.filter(author=obj).exists()
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.follower_id == request.user.id
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj.author)
-        if recipes_limit and recipes_limit.isdigit():
-            return RecipeShortSerializer(recipes[:int(recipes_limit)],
-                                         many=True).data
-        return RecipeShortSerializer(
-            recipes[:DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE],
-            many=True).data
+        return RecipeShortSerializer(obj.author.preview_recipes,
+                                     many=True).data
 
 
 class AvatarSerializer(serializers.ModelSerializer):
-    avatar = serializers.CharField(write_only=True, required=True)
+    avatar = Base64ImageField(write_only=True, required=True)
 
     class Meta:
         model = User
         fields = ('avatar',)
 
-    def validate_avatar(self, value):
-        try:
-            format_, imgstr = value.split(';base64,')
-            ext = format_.split('/')[-1]
-            return base64.b64decode(imgstr), ext
-        except Exception:
-            raise serializers.ValidationError('Invalid base64 image format.')
-
     def update(self, instance, validated_data):
-        image_data, ext = validated_data['avatar']
-        file_name = f'{uuid.uuid4()}.{ext}'
-        instance.avatar.save(file_name, ContentFile(image_data), save=True)
+        image = validated_data['avatar']
+        ext = os.path.splitext(image.name)[1]
+        instance.avatar.save(f'{uuid.uuid4()}{ext}', image, save=True)
         return instance
 
 
 class TagSerializer(serializers.ModelSerializer):
 
-    def to_internal_value(self, data):
-        if isinstance(data, int):
-            return Tag.objects.get(id=data)
-
     class Meta:
         model = Tag
         fields = ('id', 'name', 'slug')
@@ -140,50 +201,69 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class IngredientInRecipeListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['id'].resolve(
+                item.get('id') for item in data if isinstance(item, Mapping))
+        return super().to_internal_value(data)
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BatchedPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
         source='ingredient')
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
-
-    def get_name(self, obj):
-        return obj.ingredient.name
-
-    def get_measurement_unit(self, obj):
-        return obj.ingredient.measurement_unit
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = IngredientInRecipeListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = FoodgramUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = BatchedPrimaryKeyRelatedField(many=True,
+                                         queryset=Tag.objects.all())
     ingredients = IngredientInRecipeSerializer(many=True,
                                                source='recipe_ingredients')
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField(RECIPE_IMAGE_RENDITIONS,
+                                            source='image')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'name', 'image',
-                  'text', 'cooking_time', 'is_favorited',
+                  'image_renditions', 'text', 'cooking_time', 'is_favorited',
                   'is_in_shopping_cart')
 
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')))
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         request = self.context['request']
         if not (request and request.user.is_authenticated):
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return request.user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context['request']
         if not (request and request.user.is_authenticated):
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return request.user.shopping_cart.filter(recipe=obj).exists()
 
     def validate_tags(self, tags):
@@ -219,6 +299,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient in ingredients
         ])
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context['request']
         validated_data['author'] = request.user
@@ -231,9 +312,37 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self._create_ingredients(recipe, ingredients)
+        pantry_index.mark_changed([recipe.pk])
 
         return recipe
 
+    def _update_ingredients(self, recipe, ingredients):
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe)
+        }
+        amounts = {ingredient['ingredient'].id: ingredient['amount']
+                   for ingredient in ingredients}
+        removed = current.keys() - amounts.keys()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        added = [ingredient for ingredient in ingredients
+                 if ingredient['ingredient'].id not in current]
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            self._create_ingredients(recipe, added)
+        return bool(removed or changed or added)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'tags' not in validated_data:
             raise serializers.ValidationError(
@@ -250,25 +359,57 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.validate_tags(tags)
         self.validate_ingredients(ingredients)
 
+        Recipe.objects.select_for_update().only('pk').get(pk=instance.pk)
         instance.tags.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self._create_ingredients(instance, ingredients)
+        if self._update_ingredients(instance, ingredients):
+            rebuild_shopping_lists(instance.in_shopping_cart.values('user'))
+            pantry_index.mark_changed([instance.pk])
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        if validated_data:
+            instance.save(update_fields=validated_data.keys())
 
         return instance
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(RECIPE_IMAGE_RENDITIONS,
+                                            source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(RECIPE_IMAGE_RENDITIONS,
+                                            source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BULK_RECIPES_MAX_COUNT)
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=PANTRY_MAX_INGREDIENTS)
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('matched_ingredients',
+                                                 'missing_ingredients')
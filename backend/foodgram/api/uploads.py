@@ -0,0 +1,74 @@
+import base64
+import binascii
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+from app.constants import (BASE64_CHUNK_SIZE, UPLOAD_HEADER_BYTES,
+                           UPLOAD_IMAGE_FORMATS, UPLOAD_MAX_BYTES,
+                           UPLOAD_MAX_PIXELS)
+
+DATA_URI_HEADER = re.compile(r'data:image/(?P<ext>[a-z]+);base64,')
+
+
+def check_pixels(file):
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        width = height = UPLOAD_MAX_PIXELS
+    except (OSError, SyntaxError, ValueError):
+        return False
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f'Изображение больше {UPLOAD_MAX_PIXELS} пикселей.')
+    return True
+
+
+def decode_base64_image(data):
+    header = DATA_URI_HEADER.match(data[:64])
+    if header is None or header['ext'] not in UPLOAD_IMAGE_FORMATS:
+        raise serializers.ValidationError(
+            'Неверный формат изображения в base64.')
+    start = header.end()
+    length = len(data) - start
+    if length % 4:
+        raise serializers.ValidationError('Повреждённые данные base64.')
+    size = length // 4 * 3
+    if size > UPLOAD_MAX_BYTES:
+        raise serializers.ValidationError(
+            f'Размер изображения больше {UPLOAD_MAX_BYTES} байт.')
+
+    file = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    # Most formats keep their dimensions near the start, so they are read
+    # once the header budget has arrived to reject pixel bombs early; the
+    # rest are checked once the whole image is decoded.
+    pixels_checked = None
+    try:
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            file.write(base64.b64decode(
+                data[offset:offset + BASE64_CHUNK_SIZE], validate=True))
+            if pixels_checked is None and file.tell() >= UPLOAD_HEADER_BYTES:
+                position = file.tell()
+                pixels_checked = check_pixels(file)
+                file.seek(position)
+        size = file.tell()
+        if not pixels_checked and not check_pixels(file):
+            raise serializers.ValidationError(
+                'Не удалось прочитать изображение.')
+    except binascii.Error:
+        file.close()
+        raise serializers.ValidationError('Повреждённые данные base64.')
+    except serializers.ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    ext = header['ext']
+    return UploadedFile(file, name=f'temp.{ext}',
+                        content_type=f'image/{ext}', size=size)
@@ -10,6 +10,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from app.constants import DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE
+from app.middleware import SerializationTimingMixin, serialize
 from app.models import Subscription
 from app.pagination import CustomPagination
 from .serializers import AvatarSerializer, SubscriptionSerializer
@@ -17,6 +19,13 @@ from .serializers import AvatarSerializer, SubscriptionSerializer
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE
+
+
 class SubscribeView(APIView):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -25,19 +34,20 @@ class SubscribeView(APIView):
         author = get_object_or_404(User, id=author_id)
         serializer = SubscriptionSerializer(
             data={},
-            context={
-                'request': request,
-                'author': author,
-                'recipes_limit': request.query_params.get('recipes_limit')
-            }
+            context={'request': request, 'author': author}
         )
 
         if serializer.is_valid():
-            Subscription.objects.create(
+            subscription = Subscription.objects.create(
                 follower=request.user,
                 author=author
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            subscription = Subscription.objects.with_author_recipes(
+                get_recipes_limit(request)).get(pk=subscription.pk)
+            serializer = SubscriptionSerializer(
+                subscription, context={'request': request})
+            return Response(serialize(serializer),
+                            status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, author_id):
@@ -52,13 +62,15 @@ class SubscribeView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ListMySubscriptionsView(ListAPIView):
+class ListMySubscriptionsView(SerializationTimingMixin, ListAPIView):
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = CustomPagination
 
     def get_queryset(self):
-        return Subscription.objects.filter(follower=self.request.user)
+        return Subscription.objects.filter(
+            follower=self.request.user
+        ).with_author_recipes(get_recipes_limit(self.request))
 
 
 class AvatarView(APIView):
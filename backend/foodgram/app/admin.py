@@ -1,50 +1,142 @@
+from collections import defaultdict
+
 from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
+from .constants import ADMIN_ESTIMATED_COUNT_THRESHOLD
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .pantry_index import pantry_index
+from .recipe_lists import favorites, shopping_cart
+from .shopping_list import rebuild_shopping_lists
+from .signals import shift_counter
 
 User = get_user_model()
 
 
-class RecipeIngredientInline(admin.TabularInline):
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class '
+                    'WHERE oid = to_regclass(%s)',
+                    [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    preloaded = ()
+
+    def optgroups(self, name, value, attr=None):
+        selected = [obj for obj in self.preloaded
+                    if str(obj.pk) in {str(item) for item in value}]
+        if not selected:
+            return super().optgroups(name, value, attr)
+        return [(None, [
+            self.create_option(name, obj.pk,
+                               self.choices.field.label_from_instance(obj),
+                               True, index)
+            for index, obj in enumerate(selected)], 0)]
+
+
+class PreloadedAutocompleteForm(forms.ModelForm):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is None:
+            return
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, PreloadedAutocompleteSelect):
+                widget.preloaded = [getattr(self.instance, name)]
+
+
+class PreloadedAutocompleteInline(admin.TabularInline):
+    form = PreloadedAutocompleteForm
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class RecipeIngredientInline(PreloadedAutocompleteInline):
     model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
     min_num = 1
     validate_min = True
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
-class RecipeTagInline(admin.TabularInline):
+
+class RecipeTagInline(PreloadedAutocompleteInline):
     model = Recipe.tags.through
+    autocomplete_fields = ('tag',)
     min_num = 1
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
+
 
 class RecipeAdminForm(forms.ModelForm):
     class Meta:
         model = Recipe
-        exclude = ('hashcode',)
+        exclude = ('hashcode', 'image_renditions')
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     form = RecipeAdminForm
     list_display = ('id', 'name', 'author', 'get_tags', 'favorite_count')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username')
     list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     filter_horizontal = ('tags',)
     inlines = (RecipeTagInline, RecipeIngredientInline)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tags')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'author' in form.changed_data:
+            shift_counter(User, form.initial['author'], 'recipes_count', -1)
+            shift_counter(User, obj.author_id, 'recipes_count', 1)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if any(formset.has_changed() for formset in formsets
+               if formset.model is RecipeIngredient):
+            rebuild_shopping_lists(
+                form.instance.in_shopping_cart.values('user'))
+            pantry_index.mark_changed([form.instance.pk])
+
     @admin.display(description='Теги')
     def get_tags(self, obj):
         return ', '.join([tag.name for tag in obj.tags.all()])
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-
-    favorite_count.short_description = 'В избранном'
+        return obj.favorites_count
 
 
 @admin.register(User)
@@ -66,29 +158,49 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class RecipeListAdmin(admin.ModelAdmin):
     list_display = ('id', 'get_user_id', 'user', 'recipe', 'get_recipe_id')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    recipe_list = None
 
     @admin.display(description='User id')
     def get_user_id(self, obj):
-        return obj.user.id
+        return obj.user_id
 
     @admin.display(description='Recipe id')
     def get_recipe_id(self, obj):
-        return obj.recipe.id
+        return obj.recipe_id
 
+    def get_readonly_fields(self, request, obj=None):
+        return ('user', 'recipe') if obj else ()
 
-@admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'get_user_id', 'user', 'recipe', 'get_recipe_id')
-    search_fields = ('user__username', 'recipe__name')
+    def save_model(self, request, obj, form, change):
+        if not change:
+            self.recipe_list.add(obj.user, [obj.recipe_id])
+            obj.pk = self.recipe_list.entries(
+                obj.user, [obj.recipe_id]).values_list('pk', flat=True).get()
 
-    @admin.display(description='User id')
-    def get_user_id(self, obj):
-        return obj.user.id
+    def delete_model(self, request, obj):
+        self.recipe_list.remove(obj.user, [obj.recipe_id])
 
-    @admin.display(description='Recipe id')
-    def get_recipe_id(self, obj):
-        return obj.recipe.id
+    def delete_queryset(self, request, queryset):
+        recipe_ids = defaultdict(list)
+        for user_id, recipe_id in queryset.values_list('user', 'recipe'):
+            recipe_ids[user_id].append(recipe_id)
+        for user in User.objects.filter(pk__in=recipe_ids):
+            self.recipe_list.remove(user, recipe_ids[user.pk])
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(RecipeListAdmin):
+    recipe_list = favorites
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(RecipeListAdmin):
+    recipe_list = shopping_cart
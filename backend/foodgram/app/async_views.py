@@ -0,0 +1,169 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         HttpResponseRedirect)
+from django.utils.cache import get_conditional_response
+from django_filters.utils import translate_validation
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             TagSerializer)
+from .catalogue_cache import aget_catalogue_etag, get_catalogue_response_key
+from .constants import FOODGRAM_URL
+from .ingredient_index import ingredient_index
+from .middleware import serialize
+from .models import Ingredient, Recipe, Tag
+from .short_links import aresolve_short_code
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        content_type='application/json', headers=headers)
+
+
+def get_api_view(sync_view, request, args, kwargs):
+    api_view = sync_view.cls(**sync_view.initkwargs)
+    api_view.args, api_view.kwargs = args, kwargs
+    api_view.request = Request(
+        request, authenticators=api_view.get_authenticators())
+    return api_view
+
+
+def exception_response(api_view, exc):
+    response = api_view.handle_exception(exc)
+    return json_response(response.data, status=response.status_code,
+                         headers={name: value
+                                  for name, value in response.items()
+                                  if name != 'Content-Type'})
+
+
+def async_read_view(sync_view, authenticated=True):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in READ_METHODS:
+                return await sync_to_async(sync_view)(request, *args,
+                                                      **kwargs)
+            api_view = get_api_view(sync_view, request, args, kwargs)
+            try:
+                if authenticated:
+                    await sync_to_async(api_view.perform_authentication)(
+                        api_view.request)
+                return await view(api_view.request, *args, **kwargs)
+            except APIException as exc:
+                return exception_response(api_view, exc)
+
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def not_found(model):
+    return NotFound(f'No {model._meta.object_name} matches the given query.')
+
+
+async def paginate(request, queryset, pagination_class):
+    paginator = pagination_class()
+    page = await sync_to_async(paginator.paginate_queryset)(
+        queryset, request)
+    return paginator, page
+
+
+async def catalogue_response(request, build):
+    etag = await aget_catalogue_etag(request)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        key = get_catalogue_response_key(etag)
+        data = await cache.aget(key)
+        if data is None:
+            data = await build()
+            await cache.aset(key, data, settings.CATALOGUE_CACHE_TIMEOUT)
+        response = json_response(data)
+    response['ETag'] = etag
+    return response
+
+
+@async_read_view(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    filterset = RecipeFilter(request.GET,
+                             queryset=Recipe.objects.for_user(request.user),
+                             request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    queryset = await sync_to_async(lambda: filterset.qs)()
+    paginator, recipes = await paginate(request, queryset,
+                                        RecipeViewSet.pagination_class)
+    return json_response(paginator.get_paginated_response(serialize(
+        RecipeSerializer(recipes, many=True,
+                         context={'request': request}))).data)
+
+
+@async_read_view(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'}))
+async def recipe_detail(request, pk):
+    recipe = await Recipe.objects.for_user(request.user).filter(
+        pk=pk).afirst()
+    if recipe is None:
+        raise not_found(Recipe)
+    return json_response(serialize(RecipeSerializer(
+        recipe, context={'request': request})))
+
+
+@async_read_view(TagViewSet.as_view({'get': 'list'}), authenticated=False)
+async def tag_list(request):
+    async def build():
+        return serialize(TagSerializer(
+            [tag async for tag in Tag.objects.all()], many=True))
+    return await catalogue_response(request, build)
+
+
+@async_read_view(TagViewSet.as_view({'get': 'retrieve'}),
+                 authenticated=False)
+async def tag_detail(request, pk):
+    async def build():
+        tag = await Tag.objects.filter(pk=pk).afirst()
+        if tag is None:
+            raise not_found(Tag)
+        return serialize(TagSerializer(tag))
+    return await catalogue_response(request, build)
+
+
+@async_read_view(IngredientViewSet.as_view({'get': 'list'}),
+                 authenticated=False)
+async def ingredient_list(request):
+    async def build():
+        name = request.GET.get('name')
+        limit = settings.INGREDIENT_SEARCH_LIMIT if name else None
+        return await ingredient_index.asearch(name, limit)
+    return await catalogue_response(request, build)
+
+
+@async_read_view(IngredientViewSet.as_view({'get': 'retrieve'}),
+                 authenticated=False)
+async def ingredient_detail(request, pk):
+    async def build():
+        ingredient = await Ingredient.objects.filter(pk=pk).afirst()
+        if ingredient is None:
+            raise not_found(Ingredient)
+        return serialize(IngredientSerializer(ingredient))
+    return await catalogue_response(request, build)
+
+
+async def short_link_redirect(request, hashcode):
+    if request.method not in READ_METHODS:
+        return HttpResponseNotAllowed(READ_METHODS)
+    recipe_id = await aresolve_short_code(hashcode)
+    if recipe_id is None:
+        raise Http404
+    return HttpResponseRedirect(f'{FOODGRAM_URL}recipes/{recipe_id}')
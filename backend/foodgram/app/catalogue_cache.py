@@ -0,0 +1,89 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import Tag
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+
+
+def get_catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOGUE_VERSION_KEY, time.time_ns())
+    return version
+
+
+async def aget_catalogue_version():
+    version = await cache.aget(CATALOGUE_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(CATALOGUE_VERSION_KEY, time.time_ns())
+    return version
+
+
+def bump_catalogue_version():
+    cache.set(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+
+
+def get_tag_ids_by_slug():
+    key = f'catalogue:tag_ids:{get_catalogue_version()}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.CATALOGUE_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def make_catalogue_etag(version, request):
+    return quote_etag(hashlib.md5(
+        f'{version}:{request.get_full_path()}'.encode()).hexdigest())
+
+
+def get_catalogue_etag(request):
+    return make_catalogue_etag(get_catalogue_version(), request)
+
+
+async def aget_catalogue_etag(request):
+    return make_catalogue_etag(await aget_catalogue_version(), request)
+
+
+def get_catalogue_response_key(etag):
+    return f'catalogue:response:{etag}'
+
+
+class CatalogueCacheMixin:
+    authentication_classes = ()
+    renderer_classes = (JSONRenderer,)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        etag = get_catalogue_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = get_catalogue_response_key(etag)
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data,
+                          settings.CATALOGUE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve,
+                                    *args, **kwargs)
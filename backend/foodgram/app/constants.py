@@ -14,3 +14,37 @@ INGREDIENT_MIN_AMOUNT = 1
 MAX_COOKING_TIME = 32000
 MIN_COOKING_TIME = 1
 DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE = 3
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_DEFAULT_FORMAT = 'csv'
+SHORT_LINK_LENGTH = 7
+SHORT_LINK_MODULUS = 2 ** 40
+SHORT_LINK_MULTIPLIER = 0x5DEECE66D
+SHORT_LINK_MASK = 0x9E3779B97F
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': ((400, 300), 'JPEG'),
+    'thumbnail_webp': ((400, 300), 'WEBP'),
+    'webp': (None, 'WEBP'),
+}
+AVATAR_RENDITIONS = {
+    'thumbnail': ((96, 96), 'JPEG'),
+    'webp': (None, 'WEBP'),
+}
+RENDITION_MAX_SIZE = (1600, 1600)
+RENDITION_QUALITY = 85
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 40_000_000
+BASE64_CHUNK_SIZE = 64 * 1024
+UPLOAD_HEADER_BYTES = 256 * 1024
+UPLOAD_IMAGE_FORMATS = ('png', 'jpeg', 'jpg', 'gif', 'webp')
+CATALOGUE_BATCH_SIZE = 1000
+COUNTER_RECONCILE_BATCH_SIZE = 5000
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+BULK_RECIPES_MAX_COUNT = 100
+RECIPE_SEARCH_CONFIG = 'russian'
+PANTRY_MAX_INGREDIENTS = 50
+PANTRY_INDEX_CHUNK_SIZE = 10000
+PANTRY_INDEX_MAX_CHANGES = 1000
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_CHUNK_SIZE = 1000
+SIMILAR_RECIPES_MAX_POSTINGS = 20000
+SIMILAR_RECIPES_INGREDIENT_WEIGHT = 0.6
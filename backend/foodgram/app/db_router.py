@@ -0,0 +1,106 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+read_database = ContextVar('read_database', default=DEFAULT_DB_ALIAS)
+
+PRIMARY_ONLY_MODELS = {'authtoken.token'}
+
+REPLICA_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM
+            now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+class ReplicaMonitor:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def lag(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            connection.ensure_connection()
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            return float(cursor.fetchone()[0])
+
+    def is_available(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            checked_at, available = self.checked.get(alias, (None, False))
+        if (checked_at is not None
+                and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL):
+            return available
+        try:
+            available = self.lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+        except DatabaseError:
+            available = False
+        with self.lock:
+            self.checked[alias] = (now, available)
+        return available
+
+    def choose(self):
+        replicas = [alias for alias in settings.REPLICA_DATABASES
+                    if self.is_available(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def get_sticky_key(request):
+    identity = (request.META.get('HTTP_AUTHORIZATION')
+                or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if identity:
+        return ('replica:primary:'
+                + hashlib.sha256(identity.encode()).hexdigest())
+    return None
+
+
+def is_sticky(request):
+    if request.COOKIES.get(settings.REPLICA_STICKY_COOKIE):
+        return True
+    key = get_sticky_key(request)
+    return key is not None and cache.get(key, False)
+
+
+def stick_to_primary(request, response):
+    key = get_sticky_key(request)
+    if key is not None:
+        cache.set(key, True, settings.REPLICA_STICKINESS_SECONDS)
+    response.set_cookie(settings.REPLICA_STICKY_COOKIE, '1',
+                        max_age=settings.REPLICA_STICKINESS_SECONDS,
+                        secure=settings.SESSION_COOKIE_SECURE,
+                        httponly=True, samesite='Lax')
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.label_lower in PRIMARY_ONLY_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,67 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Ingredient
+
+
+def normalize(name):
+    return name.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = ([], [])
+        self._built_at = None
+
+    def invalidate(self):
+        self._built_at = None
+
+    def _is_stale(self):
+        return (self._built_at is None
+                or time.monotonic() - self._built_at
+                > settings.INGREDIENT_INDEX_TTL)
+
+    def _rows(self):
+        return Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+
+    def _build(self, rows):
+        entries = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        items = [{'id': pk, 'name': name, 'measurement_unit': unit}
+                 for _, name, pk, unit in entries]
+        self._entries = ([entry[0] for entry in entries], items)
+        self._built_at = time.monotonic()
+
+    def search(self, prefix=None, limit=None):
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._build(self._rows())
+        return self._lookup(prefix, limit)
+
+    async def asearch(self, prefix=None, limit=None):
+        if self._is_stale():
+            self._build([row async for row in self._rows()])
+        return self._lookup(prefix, limit)
+
+    def _lookup(self, prefix, limit):
+        keys, items = self._entries
+        if not prefix:
+            return items[:limit]
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return items[start:end]
+
+
+ingredient_index = IngredientIndex()
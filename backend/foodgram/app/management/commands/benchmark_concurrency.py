@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from statistics import quantiles
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand
+from django.utils.encoding import iri_to_uri
+
+DEFAULT_PATHS = ('/api/recipes/', '/api/recipes/?limit=20', '/api/tags/',
+                 '/api/ingredients/?name=а')
+
+
+def fetch(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    except (URLError, OSError):
+        status = None
+    return status, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Сравнить пропускную способность серверов (например, WSGI и '
+            'ASGI) на горячих эндпоинтах чтения при большом числе '
+            'одновременных клиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_urls', nargs='+',
+                            help='Адреса серверов, например '
+                                 'http://localhost:8001.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Путь запроса; можно указать несколько.')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        self.stdout.write(
+            f'Клиентов: {options["concurrency"]}, '
+            f'запросов: {options["requests"]}, путей: {len(paths)}')
+        for base_url in options['base_urls']:
+            urls = [iri_to_uri(base_url.rstrip('/') + path) for path in paths]
+            self.report(base_url, self.run(
+                urls, options['concurrency'], options['requests'],
+                options['timeout']))
+
+    def run(self, urls, concurrency, requests, timeout):
+        with ThreadPoolExecutor(concurrency) as executor:
+            fetch(urls[0], timeout)
+            start = time.perf_counter()
+            results = list(executor.map(
+                lambda url: fetch(url, timeout),
+                islice(cycle(urls), requests)))
+            elapsed = time.perf_counter() - start
+        return results, elapsed
+
+    def report(self, base_url, measurement):
+        results, elapsed = measurement
+        latencies = sorted(latency for status, latency in results
+                           if status == 200)
+        errors = len(results) - len(latencies)
+        if len(latencies) < 2:
+            self.stdout.write(self.style.ERROR(
+                f'{base_url}: успешных ответов нет, ошибок {errors}'))
+            return
+        p50, p95, p99 = (quantiles(latencies, n=100)[index]
+                         for index in (49, 94, 98))
+        self.stdout.write(
+            f'{base_url}: {len(latencies) / elapsed:.1f} запросов/с, '
+            f'p50 {p50 * 1e3:.1f} мс, p95 {p95 * 1e3:.1f} мс, '
+            f'p99 {p99 * 1e3:.1f} мс, ошибок {errors}')
@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...ingredient_index import IngredientIndex
+from ...models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнить поиск ингредиентов по префиксу через ORM '
+            'и через индекс в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Количество случайных префиксов.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stdout.write(self.style.ERROR('Каталог ингредиентов пуст.'))
+            return
+        rng = random.Random(options['seed'])
+        prefixes = [name[:rng.randint(1, 3)]
+                    for name in rng.choices(names, k=options['queries'])]
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+
+        start = time.perf_counter()
+        for prefix in prefixes:
+            list(Ingredient.objects.filter(name__istartswith=prefix)
+                 .values('id', 'name', 'measurement_unit')[:limit])
+        orm_time = time.perf_counter() - start
+
+        index = IngredientIndex()
+        start = time.perf_counter()
+        index.search()
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix, limit)
+        index_time = time.perf_counter() - start
+
+        count = len(prefixes)
+        self.stdout.write(
+            f'Ингредиентов: {len(names)}, запросов: {count}\n'
+            f'ORM:    {orm_time / count * 1e6:.1f} мкс на запрос\n'
+            f'Индекс: {index_time / count * 1e6:.1f} мкс на запрос '
+            f'(построение {build_time * 1e3:.1f} мс)')
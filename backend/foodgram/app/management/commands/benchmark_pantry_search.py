@@ -0,0 +1,70 @@
+import random
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from ...constants import PAGE_SIZE
+from ...models import Ingredient, Recipe
+from ...pantry_index import pantry_index
+
+
+def index_size(index):
+    return (sys.getsizeof(index._recipe_ids)
+            + sum(sys.getsizeof(posting)
+                  for posting in index._postings.values())
+            + sum(sys.getsizeof(mask)
+                  for mask in index._size_masks.values()))
+
+
+class Command(BaseCommand):
+    help = ('Сравнить подбор рецептов по имеющимся ингредиентам: GROUP BY '
+            'по всей таблице против инвертированного индекса в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[3, 10, 25],
+                            help='Сколько ингредиентов у пользователя.')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.filter(
+            recipeingredient__isnull=False).distinct().values_list(
+                'id', flat=True))
+        start = time.perf_counter()
+        pantry_index.match([])
+        self.stdout.write(
+            f'Рецептов: {len(pantry_index._recipe_ids)}, построение индекса '
+            f'{(time.perf_counter() - start) * 1e3:.0f} мс, '
+            f'размер ~{index_size(pantry_index) / 2 ** 20:.1f} МБ')
+        for size in options['sizes']:
+            pantries = [rng.sample(ingredient_ids, size)
+                        for _ in range(options['repeat'])]
+            sql_time = self.measure(pantries, self.sql_page)
+            index_time = self.measure(pantries, self.index_page)
+            self.stdout.write(
+                f'{size} ингредиентов: SQL {sql_time * 1e3:.1f} мс, '
+                f'индекс {index_time * 1e3:.2f} мс на страницу с подсчётом')
+
+    def measure(self, pantries, page):
+        start = time.perf_counter()
+        for pantry in pantries:
+            page(pantry)
+        return (time.perf_counter() - start) / len(pantries)
+
+    def sql_page(self, pantry):
+        queryset = Recipe.objects.annotate(
+            matched=Count('recipe_ingredients', filter=Q(
+                recipe_ingredients__ingredient_id__in=pantry)),
+            total=Count('recipe_ingredients'),
+        ).filter(matched__gt=0).order_by(
+            '-matched', F('total') - F('matched'), '-id')
+        return (list(queryset.values_list('id', 'matched')[:PAGE_SIZE]),
+                queryset.count())
+
+    def index_page(self, pantry):
+        matches = pantry_index.match(pantry)
+        return matches[:PAGE_SIZE], len(matches)
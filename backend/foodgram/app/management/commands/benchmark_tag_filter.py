@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from ...constants import PAGE_SIZE
+from ...models import Recipe, RecipeTag, Tag
+
+
+class Command(BaseCommand):
+    help = ('Сравнить планы запросов и время фильтрации рецептов по тегам: '
+            'DISTINCT по соединению против подзапроса EXISTS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Слаги тегов.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true',
+                            help='Вывести планы запросов.')
+
+    def handle(self, *args, **options):
+        slugs = options['slugs'] or list(
+            Tag.objects.values_list('slug', flat=True)[:2])
+        query = '&'.join(f'tags={slug}' for slug in slugs)
+        request = RequestFactory().get(f'/api/recipes/?{query}')
+        request.user = AnonymousUser()
+        tag_ids = Tag.objects.filter(slug__in=slugs).values('id')
+        variants = {
+            'distinct': Recipe.objects.filter(
+                tags__slug__in=slugs).distinct(),
+            'exists': RecipeFilter(request.GET, Recipe.objects.all(),
+                                   request=request).qs,
+            'exists (all)': Recipe.objects.filter(*(
+                Exists(RecipeTag.objects.filter(recipe=OuterRef('pk'),
+                                                tag_id=tag_id))
+                for tag_id in tag_ids.values_list('id', flat=True))),
+        }
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}, '
+                          f'теги: {", ".join(slugs)}')
+        for name, queryset in variants.items():
+            page = queryset[:PAGE_SIZE]
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                list(page)
+                queryset.count()
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write(f'{name}: {elapsed * 1e3:.2f} мс на страницу '
+                              f'с подсчётом')
+            if options['explain']:
+                self.stdout.write(page.explain())
@@ -0,0 +1,87 @@
+import base64
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from api.uploads import decode_base64_image
+
+
+def decode_in_memory(data):
+    format_, imgstr = data.split(';base64,')
+    ext = format_.split('/')[-1]
+    return ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+
+
+DECODERS = {
+    'в памяти': decode_in_memory,
+    'потоково': decode_base64_image,
+}
+
+
+def max_rss():
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_max_rss():
+    # Linux resets the peak RSS to the current one when "5" is written
+    # here, so loading the input does not hide the peak of decoding it.
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+class Command(BaseCommand):
+    help = ('Сравнить пиковое потребление памяти (RSS) при разборе '
+            'изображения в base64: целиком в памяти и потоково во '
+            'временный файл. Каждый способ запускается в отдельном '
+            'процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megabytes', type=float, default=8)
+        parser.add_argument('--decode', choices=DECODERS,
+                            help='Разобрать изображение из --input в '
+                                 'текущем процессе и вывести RSS.')
+        parser.add_argument('--input')
+
+    def handle(self, *args, **options):
+        if options['decode']:
+            return self.decode(options['decode'], options['input'])
+        side = int((options['megabytes'] * 1024 * 1024 / 3) ** 0.5)
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)
+                        ).save(buffer, 'PNG', compress_level=0)
+        data = ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+        del buffer
+        self.stdout.write(f'Изображение: {side}x{side}, '
+                          f'base64: {len(data) / 1024 / 1024:.1f} МБ')
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'image.txt'
+            path.write_text(data)
+            for name in DECODERS:
+                baseline, peak = map(int, subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / 'manage.py'),
+                     'benchmark_upload_memory', '--decode', name,
+                     '--input', str(path)],
+                    capture_output=True, text=True, check=True,
+                ).stdout.split())
+                self.stdout.write(
+                    f'{name}: пик RSS {peak / 1024 / 1024:.1f} МБ, '
+                    f'прирост при разборе '
+                    f'{(peak - baseline) / 1024 / 1024:.1f} МБ')
+
+    def decode(self, name, path):
+        data = Path(path).read_text()
+        reset_max_rss()
+        baseline = max_rss()
+        DECODERS[name](data).close()
+        self.stdout.write(f'{baseline} {max_rss()}')
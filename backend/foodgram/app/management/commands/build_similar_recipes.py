@@ -0,0 +1,155 @@
+import heapq
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from ...constants import (SIMILAR_RECIPES_CHUNK_SIZE, SIMILAR_RECIPES_COUNT,
+                          SIMILAR_RECIPES_INGREDIENT_WEIGHT,
+                          SIMILAR_RECIPES_MAX_POSTINGS)
+from ...models import Favorite, Recipe, RecipeIngredient, SimilarRecipe
+
+
+def group_pairs(pairs, max_size=None):
+    groups = defaultdict(lambda: array('q'))
+    for key, value in pairs:
+        groups[key].append(value)
+    return {key: values for key, values in groups.items()
+            if max_size is None or len(values) <= max_size}
+
+
+def invert(groups, max_size=None):
+    return group_pairs(((value, key) for key, values in groups.items()
+                        for value in values), max_size)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать похожие рецепты по общим ингредиентам и общему '
+            'избранному и сохранить лучших соседей каждого рецепта.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int,
+                            default=SIMILAR_RECIPES_COUNT)
+        parser.add_argument('--chunk-size', type=int,
+                            default=SIMILAR_RECIPES_CHUNK_SIZE)
+        parser.add_argument('--max-postings', type=int,
+                            default=SIMILAR_RECIPES_MAX_POSTINGS,
+                            help='Не учитывать ингредиенты и пользователей '
+                                 'с большим числом рецептов.')
+        parser.add_argument('--ingredient-weight', type=float,
+                            default=SIMILAR_RECIPES_INGREDIENT_WEIGHT,
+                            help='Доля сходства по ингредиентам, '
+                                 'остальное — по избранному.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.top_k = options['top_k']
+        self.ingredient_weight = options['ingredient_weight']
+        self.load_ingredients(options['max_postings'])
+        self.load_favorites(options['max_postings'])
+        bounds = Recipe.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return
+        stored = 0
+        chunk_size = options['chunk_size']
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            recipes = SimilarRecipe.objects.filter(
+                recipe_id__gte=start, recipe_id__lt=start + chunk_size)
+            neighbours = self.build_chunk(start, start + chunk_size)
+            with transaction.atomic():
+                recipes.delete()
+                SimilarRecipe.objects.bulk_create(neighbours)
+            stored += len(neighbours)
+            self.stdout.write(f'Рецепты до {start + chunk_size - 1}: '
+                              f'связей {stored}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны за '
+            f'{time.perf_counter() - started:.0f} с.'))
+
+    def load_ingredients(self, max_postings):
+        self.ingredients = group_pairs(
+            RecipeIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id').iterator(
+                    chunk_size=SIMILAR_RECIPES_CHUNK_SIZE * 10))
+        postings = invert(self.ingredients, max_postings)
+        self.weights = {
+            ingredient_id: math.log(
+                1 + len(self.ingredients) / len(recipe_ids)) ** 2
+            for ingredient_id, recipe_ids in postings.items()}
+        norms = defaultdict(float)
+        for ingredient_id, recipe_ids in postings.items():
+            weight = self.weights[ingredient_id]
+            for recipe_id in recipe_ids:
+                norms[recipe_id] += weight
+        self.inverse_norms = {recipe_id: 1 / math.sqrt(norm)
+                              for recipe_id, norm in norms.items()}
+        # A recipe sharing a single ingredient with another can only be
+        # among its neighbours if it is one of the shortest recipes with
+        # that ingredient, so the rest of the posting is never scored.
+        self.leaders = {
+            ingredient_id: array('q', heapq.nlargest(
+                self.top_k + 1, recipe_ids,
+                key=self.inverse_norms.__getitem__))
+            for ingredient_id, recipe_ids in postings.items()}
+        self.postings = postings
+
+    def load_favorites(self, max_postings):
+        self.favorites = group_pairs(
+            Favorite.objects.values_list('user_id', 'recipe_id').iterator(
+                chunk_size=SIMILAR_RECIPES_CHUNK_SIZE * 10),
+            max_postings)
+        self.fans = invert(self.favorites, max_postings)
+        self.favorites = {
+            user_id: array('q', (recipe_id for recipe_id in recipe_ids
+                                 if recipe_id in self.fans))
+            for user_id, recipe_ids in self.favorites.items()}
+
+    def build_chunk(self, start, stop):
+        neighbours = []
+        for recipe_id in sorted(
+                recipe_id for recipe_id in self.ingredients.keys()
+                | self.fans.keys() if start <= recipe_id < stop):
+            neighbours += [
+                SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=round(score, 6))
+                for similar_id, score in self.neighbours(recipe_id)]
+        return neighbours
+
+    def neighbours(self, recipe_id):
+        weights = {ingredient_id: self.weights[ingredient_id]
+                   for ingredient_id in self.ingredients.get(recipe_id, ())
+                   if ingredient_id in self.weights}
+        shared = Counter(chain.from_iterable(
+            self.postings[ingredient_id] for ingredient_id in weights))
+        candidates = {other_id for other_id, count in shared.items()
+                      if count > 1}
+        candidates.update(chain.from_iterable(
+            self.leaders[ingredient_id] for ingredient_id in weights))
+        fans = self.fans.get(recipe_id, ())
+        shared_fans = Counter(chain.from_iterable(
+            self.favorites[user_id] for user_id in fans))
+        candidates.update(shared_fans)
+        candidates.discard(recipe_id)
+        ingredient_factor = (self.ingredient_weight
+                             * self.inverse_norms.get(recipe_id, 0))
+        favorite_factor = ((1 - self.ingredient_weight)
+                           / math.sqrt(len(fans) or 1))
+        scores = {}
+        for other_id in candidates:
+            score = 0
+            if other_id in shared:
+                score += (ingredient_factor * self.inverse_norms[other_id]
+                          * sum(weights.get(other_ingredient_id, 0)
+                                for other_ingredient_id
+                                in self.ingredients[other_id]))
+            if other_id in shared_fans:
+                score += favorite_factor * shared_fans[other_id] / math.sqrt(
+                    len(self.fans[other_id]))
+            scores[other_id] = score
+        return [(other_id, scores[other_id]) for other_id in heapq.nlargest(
+            self.top_k, scores, key=scores.__getitem__)]
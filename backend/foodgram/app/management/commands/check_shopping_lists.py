@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from ...constants import COUNTER_RECONCILE_BATCH_SIZE
+from ...models import ShoppingListItem
+from ...shopping_list import get_live_totals, rebuild_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнить сохранённые итоги списков покупок с агрегатом по '
+            'рецептам в корзине и при необходимости пересобрать их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=COUNTER_RECONCILE_BATCH_SIZE)
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересобрать расходящиеся списки.')
+
+    def handle(self, *args, **options):
+        bounds = User.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return
+        batch_size = options['batch_size']
+        diverged = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            user_ids = User.objects.filter(
+                pk__range=(start, start + batch_size - 1)).values('pk')
+            live = set(get_live_totals(user_ids))
+            stored = set(ShoppingListItem.objects.filter(
+                user__in=user_ids
+            ).values_list('user', 'ingredient', 'amount').order_by())
+            users = {user_id for user_id, _, _ in live ^ stored}
+            diverged += len(users)
+            if users and options['fix']:
+                with transaction.atomic():
+                    rebuild_shopping_lists(users)
+        self.stdout.write(f'Расходящихся списков покупок: {diverged}')
+        if diverged and not options['fix']:
+            raise CommandError('Списки покупок расходятся с корзинами.')
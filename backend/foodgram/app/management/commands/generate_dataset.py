@@ -0,0 +1,162 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ...constants import INGREDIENT_MAX_AMOUNT, MAX_COOKING_TIME
+from ...models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                       RecipeTag, ShoppingCart, Subscription, Tag)
+from ...pantry_index import pantry_index
+
+User = get_user_model()
+
+POWER_LAW_ALPHA = 1.5
+DATASET_PASSWORD = 'foodgram-load'
+
+
+class Command(BaseCommand):
+    help = ('Заполнить базу данных воспроизводимым синтетическим набором '
+            'пользователей, рецептов, подписок, избранного и покупок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument('--follows-per-user', type=float, default=10)
+        parser.add_argument('--favorites-per-user', type=float, default=20)
+        parser.add_argument('--cart-per-user', type=float, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имён создаваемых пользователей.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.ensure_catalogues()
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True))
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+        user_ids = self.create_users(options['users'], options['prefix'])
+        recipe_ids = self.create_recipes(options['recipes'], user_ids)
+        self.create_relations(
+            Subscription, 'follower_id', 'author_id', user_ids, user_ids,
+            options['follows_per_user'], skew=True, exclude_self=True)
+        self.create_relations(
+            Favorite, 'user_id', 'recipe_id', user_ids, recipe_ids,
+            options['favorites_per_user'], skew=True)
+        self.create_relations(
+            ShoppingCart, 'user_id', 'recipe_id', user_ids, recipe_ids,
+            options['cart_per_user'], skew=False)
+        call_command('reconcile_counters', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        call_command('check_shopping_lists', batch_size=self.batch_size,
+                     fix=True, stdout=self.stdout)
+        pantry_index.mark_changed()
+        self.stdout.write(self.style.SUCCESS('Набор данных создан.'))
+
+    def ensure_catalogues(self):
+        if not Ingredient.objects.exists():
+            call_command('load_catalogue', 'ingredients',
+                         settings.BASE_DIR / 'ingredients.json',
+                         stdout=self.stdout)
+        if not Tag.objects.exists():
+            call_command('load_catalogue', 'tags',
+                         settings.BASE_DIR / 'tags.json', stdout=self.stdout)
+
+    def report(self, label, done, total=None):
+        self.stdout.write(f'{label}: {done}' + (f'/{total}' if total else ''))
+
+    def power_law_count(self, mean, limit):
+        scale = mean * (POWER_LAW_ALPHA - 1) / POWER_LAW_ALPHA
+        return min(limit, int(scale * self.rng.paretovariate(
+            POWER_LAW_ALPHA)))
+
+    def create_users(self, count, prefix):
+        password = make_password(DATASET_PASSWORD)
+        user_ids = []
+        for start in range(0, count, self.batch_size):
+            users = [
+                User(username=f'{prefix}{number}',
+                     email=f'{prefix}{number}@example.com',
+                     first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                     password=password)
+                for number in range(start, min(count, start + self.batch_size))
+            ]
+            user_ids += [user.pk for user in User.objects.bulk_create(users)]
+            self.report('Пользователи', len(user_ids), count)
+        return user_ids
+
+    def create_recipes(self, count, user_ids):
+        rng = self.rng
+        author_weights = list(accumulate(
+            rng.paretovariate(POWER_LAW_ALPHA) for _ in user_ids))
+        now = timezone.now()
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            ingredients = [rng.sample(self.ingredient_ids, rng.randint(3, 12))
+                           for _ in range(size)]
+            recipes = [
+                Recipe(author_id=author_id,
+                       name=f'Рецепт {start + number}',
+                       text='Синтетический рецепт для нагрузочного теста.',
+                       image='recipes/sample.png',
+                       cooking_time=rng.randint(5, MAX_COOKING_TIME // 100))
+                for number, author_id in enumerate(rng.choices(
+                    user_ids, cum_weights=author_weights, k=size))
+            ]
+            with transaction.atomic():
+                Recipe.objects.bulk_create(recipes)
+                for number, recipe in enumerate(recipes):
+                    recipe.created_at = now - timedelta(
+                        minutes=count - start - number)
+                Recipe.objects.bulk_update(recipes, ['created_at'])
+                RecipeIngredient.objects.bulk_create([
+                    RecipeIngredient(
+                        recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                        amount=rng.randint(1, INGREDIENT_MAX_AMOUNT // 4))
+                    for recipe, recipe_ingredients in zip(recipes,
+                                                          ingredients)
+                    for ingredient_id in recipe_ingredients
+                ])
+                RecipeTag.objects.bulk_create([
+                    RecipeTag(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in rng.sample(
+                        self.tag_ids, rng.randint(1, len(self.tag_ids)))
+                ])
+            recipe_ids += [recipe.pk for recipe in recipes]
+            self.report('Рецепты', len(recipe_ids), count)
+        return recipe_ids
+
+    def create_relations(self, model, source_field, target_field, sources,
+                         targets, mean, skew, exclude_self=False):
+        rng = self.rng
+        cum_weights = list(accumulate(
+            rng.paretovariate(POWER_LAW_ALPHA) if skew else 1
+            for _ in targets))
+        rows, created = [], 0
+        for source in sources:
+            count = (self.power_law_count(mean, len(targets) - 1) if skew
+                     else min(len(targets), int(rng.expovariate(1 / mean))))
+            chosen = set(rng.choices(targets, cum_weights=cum_weights,
+                                     k=count))
+            if exclude_self:
+                chosen.discard(source)
+            rows += [model(**{source_field: source, target_field: target})
+                     for target in chosen]
+            if len(rows) >= self.batch_size:
+                model.objects.bulk_create(rows, ignore_conflicts=True)
+                created += len(rows)
+                rows = []
+        model.objects.bulk_create(rows, ignore_conflicts=True)
+        created += len(rows)
+        self.report(model._meta.verbose_name_plural, created)
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from ...catalogue_cache import bump_catalogue_version
+from ...constants import CATALOGUE_BATCH_SIZE
+from ...ingredient_index import ingredient_index
+from ...models import Ingredient, Tag
+
+CATALOGUES = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'), 'name'),
+    'tags': (Tag, ('name', 'slug'), 'slug'),
+}
+JSON_READ_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = file.read(JSON_READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Ожидался массив JSON.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+        if not chunk:
+            raise ValueError('Массив JSON не закрыт.')
+
+
+def iter_rows(path, fields):
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.suffix == '.csv':
+            for row in csv.reader(file):
+                if row and tuple(row) != fields:
+                    yield dict(zip(fields, row))
+        else:
+            yield from iter_json_array(file)
+
+
+class Command(BaseCommand):
+    help = ('Загрузить или обновить каталог ингредиентов или тегов '
+            'из json или csv. Повторный запуск безопасен.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalogue', choices=CATALOGUES,
+                            help='Каталог для загрузки.')
+        parser.add_argument('path', type=Path,
+                            help='Путь к json или csv файлу.')
+        parser.add_argument('--batch-size', type=int,
+                            default=CATALOGUE_BATCH_SIZE)
+        parser.add_argument('--copy', action='store_true',
+                            help='Загружать через COPY во временную таблицу '
+                                 '(только PostgreSQL).')
+
+    def handle(self, *args, **options):
+        model, fields, key = CATALOGUES[options['catalogue']]
+        path = options['path']
+        if not path.is_file():
+            raise CommandError(f'Файл не найден: {path}')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('Режим --copy доступен только для PostgreSQL.')
+        load = self.load_with_copy if options['copy'] else self.load
+        rows = iter_rows(path, fields)
+        try:
+            with transaction.atomic():
+                inserted, updated, skipped = load(
+                    model, fields, key, rows, options['batch_size'])
+        except (DatabaseError, KeyError, TypeError, ValueError) as error:
+            raise CommandError(f'Некорректные данные в {path}: {error!r}')
+        bump_catalogue_version()
+        ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, обновлено: {updated}, '
+            f'без изменений: {skipped}'))
+
+    def batches(self, fields, key, rows, batch_size):
+        processed = 0
+        while True:
+            batch = {}
+            for row in islice(rows, batch_size):
+                values = tuple(str(row[field]).strip() for field in fields)
+                batch[values[fields.index(key)]] = values
+            if not batch:
+                return
+            yield batch
+            processed += len(batch)
+            self.stdout.write(f'Обработано записей: {processed}')
+
+    def load(self, model, fields, key, rows, batch_size):
+        inserted = updated = skipped = 0
+        for batch in self.batches(fields, key, rows, batch_size):
+            existing = {
+                values[fields.index(key)]: values
+                for values in model.objects.filter(
+                    **{f'{key}__in': batch}).values_list(*fields)
+            }
+            changed = []
+            for key_value, values in batch.items():
+                if key_value not in existing:
+                    inserted += 1
+                elif existing[key_value] != values:
+                    updated += 1
+                else:
+                    skipped += 1
+                    continue
+                changed.append(model(**dict(zip(fields, values))))
+            model.objects.bulk_create(
+                changed, batch_size=batch_size, update_conflicts=True,
+                unique_fields=[key],
+                update_fields=[field for field in fields if field != key])
+        return inserted, updated, skipped
+
+    def load_with_copy(self, model, fields, key, rows, batch_size):
+        table = model._meta.db_table
+        columns = ', '.join(fields)
+        updates = ', '.join(f'{field} = EXCLUDED.{field}'
+                            for field in fields if field != key)
+        changed = ' OR '.join(f'{table}.{field} IS DISTINCT FROM '
+                              f'EXCLUDED.{field}'
+                              for field in fields if field != key)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE catalogue_staging ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA')
+            for batch in self.batches(fields, key, rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch.values())
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY catalogue_staging ({columns}) FROM STDIN '
+                    f'WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT DISTINCT ON ({key}) {columns} '
+                f'FROM catalogue_staging ORDER BY {key} '
+                f'ON CONFLICT ({key}) DO UPDATE SET {updates} '
+                f'WHERE {changed} '
+                f'RETURNING (xmax = 0)')
+            results = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT {key}) FROM catalogue_staging')
+            staged = cursor.fetchone()[0]
+        inserted = sum(results)
+        updated = len(results) - inserted
+        return inserted, updated, staged - inserted - updated
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ...constants import COUNTER_RECONCILE_BATCH_SIZE
+from ...models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{related_field: OuterRef('pk')})
+        .order_by().values(related_field).annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать денормализованные счётчики избранного, списков '
+            'покупок и рецептов автора, исправив расхождения пакетами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=COUNTER_RECONCILE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только подсчитать расхождения.')
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = self.reconcile(
+                model, field, actual_count(related_model, related_field),
+                options['batch_size'], options['dry_run'])
+            self.stdout.write(
+                f'{model._meta.label}.{field}: расхождений {fixed}')
+
+    def reconcile(self, model, field, actual, batch_size, dry_run):
+        bounds = model.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return 0
+        fixed = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            drifted = model.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).exclude(**{field: actual})
+            if dry_run:
+                fixed += drifted.count()
+                continue
+            with transaction.atomic():
+                fixed += drifted.update(**{field: actual})
+        return fixed
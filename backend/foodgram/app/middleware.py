@@ -0,0 +1,211 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .db_router import (is_sticky, read_database, replica_monitor,
+                        stick_to_primary)
+
+logger = logging.getLogger('foodgram.requests')
+
+current_metrics = ContextVar('request_metrics', default=None)
+
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SQL_PARAM_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def query_shape(sql):
+    return SQL_PARAM_LIST.sub('(%s, ...)', SQL_LITERAL.sub('?', sql))
+
+
+@contextmanager
+def timed_serialization():
+    metrics = current_metrics.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_time += time.perf_counter() - start
+        metrics.serializing = False
+
+
+def track_field(field, metrics):
+    to_representation = field.to_representation
+    name = f'{type(field.parent).__name__}.{field.field_name}'
+
+    def wrapper(value):
+        outer, metrics.field = metrics.field, name
+        try:
+            return to_representation(value)
+        finally:
+            metrics.field = outer
+
+    field.to_representation = wrapper
+
+
+def track_fields(field, metrics):
+    child = getattr(field, 'child', None)
+    if child is not None:
+        track_fields(child, metrics)
+    if isinstance(field, serializers.Serializer):
+        for nested in field.fields.values():
+            track_fields(nested, metrics)
+    if field.field_name:
+        track_field(field, metrics)
+
+
+def serialize(serializer):
+    metrics = current_metrics.get()
+    if metrics is not None and not metrics.serializing:
+        track_fields(serializer, metrics)
+    with timed_serialization():
+        return serializer.data
+
+
+class SerializationTimingMixin:
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serialize(self.get_serializer(page, many=True)))
+        return Response(serialize(self.get_serializer(queryset, many=True)))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(serialize(self.get_serializer(self.get_object())))
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.render_time = 0.0
+        self.render_start = None
+        self.serializing = False
+        self.field = None
+        self.shapes = Counter()
+        self.phases = {}
+        self.fields = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == settings.N_PLUS_ONE_THRESHOLD:
+                self.phases[shape] = ('serialization' if self.serializing
+                                      else 'view')
+                self.fields[shape] = self.field
+
+
+class RequestInstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'serialize;dur={metrics.serialization_time * 1000:.1f}',
+            f'render;dur={metrics.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        view = getattr(view_func, 'cls', view_func)
+        name = f'{view.__module__}.{view.__qualname__}'
+        actions = getattr(view_func, 'actions', None)
+        if actions and request.method.lower() in actions:
+            name += f'.{actions[request.method.lower()]}'
+        metrics.view = name
+
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        metrics.render_start = time.perf_counter()
+
+        def finish_render(response):
+            metrics.render_time = time.perf_counter() - metrics.render_start
+
+        response.add_post_render_callback(finish_render)
+        return response
+
+    def log(self, request, response, metrics, total):
+        for shape, count in metrics.shapes.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                logger.warning(json.dumps({
+                    'event': 'n_plus_one',
+                    'path': request.path,
+                    'view': metrics.view,
+                    'phase': metrics.phases.get(shape),
+                    'field': metrics.fields.get(shape),
+                    'count': count,
+                    'sql': shape[:500],
+                }, ensure_ascii=False))
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': metrics.view,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'db_ms': round(metrics.db_time * 1000, 1),
+                'serialize_ms': round(metrics.serialization_time * 1000, 1),
+                'render_ms': round(metrics.render_time * 1000, 1),
+                'queries': metrics.queries,
+            }, ensure_ascii=False))
+
+
+class ReplicaRoutingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = read_database.set(
+            replica_monitor.choose() if safe and not is_sticky(request)
+            else DEFAULT_DB_ALIAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if not safe and response.status_code < 400:
+            stick_to_primary(request, response)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.18 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='shopping_cart_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
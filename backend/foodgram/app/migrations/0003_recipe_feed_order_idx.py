@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_foodgramuser_shopping_cart_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-created_at', 'name', 'id'], name='recipe_feed_order_idx'),
+        ),
+    ]
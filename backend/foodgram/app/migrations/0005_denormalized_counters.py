@@ -0,0 +1,53 @@
+# Generated by Django 4.2.18 on 2026-10-18 03:41
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    User = apps.get_model('app', 'FoodgramUser')
+    Favorite = apps.get_model('app', 'Favorite')
+    ShoppingCart = apps.get_model('app', 'ShoppingCart')
+    Recipe.objects.update(
+        favorites_count=count_of(Favorite, 'recipe'),
+        shopping_cart_count=count_of(ShoppingCart, 'recipe'))
+    User.objects.update(recipes_count=count_of(Recipe, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-created_at', 'name', 'id'], name='recipe_popular_order_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
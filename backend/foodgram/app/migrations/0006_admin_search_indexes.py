@@ -0,0 +1,41 @@
+from django.db import migrations
+
+SEARCH_INDEXES = (
+    ('app_recipe_name_trgm', 'app_recipe', 'name'),
+    ('app_ingredient_name_trgm', 'app_ingredient', 'name'),
+    ('app_foodgramuser_username_trgm', 'app_foodgramuser', 'username'),
+    ('app_foodgramuser_email_trgm', 'app_foodgramuser', 'email'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions "
+                       "WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.18 on 2026-10-18 03:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipeIngredient = apps.get_model('app', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('app', 'ShoppingListItem')
+    totals = (RecipeIngredient.objects
+              .filter(recipe__in_shopping_cart__isnull=False)
+              .values('recipe__in_shopping_cart__user', 'ingredient')
+              .annotate(total=Sum('amount'))
+              .values_list('recipe__in_shopping_cart__user', 'ingredient',
+                           'total')
+              .order_by())
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          amount=total)
+         for user_id, ingredient_id, total in totals.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='app.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списков покупок',
+                'ordering': ['user', 'ingredient'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.18 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PantryChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_ids', models.JSONField(null=True, verbose_name='Рецепты')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса продуктов',
+                'verbose_name_plural': 'Изменения индекса продуктов',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -3,9 +3,12 @@ import os
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
 
 from .constants import (INGREDIENT_MAX_AMOUNT, INGREDIENT_MIN_AMOUNT,
                         INGREDIENT_NAME_MAX_LEN, MAX_COOKING_TIME,
@@ -26,9 +29,13 @@ class FoodgramUser(AbstractUser):
                     r"не соответствующие регулярному выражению '^[\w.@+-]+\Z'",
             code='invalid_username')])
     avatar = models.ImageField(upload_to='avatars/')
+    avatar_renditions = models.JSONField(default=dict, blank=True)
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=USER_FIRST_NAME_MAX_LEN)
     last_name = models.CharField(max_length=USER_LAST_NAME_MAX_LEN)
+    shopping_cart_updated_at = models.DateTimeField(blank=True, null=True)
+    recipes_count = models.PositiveIntegerField('Рецептов', default=0,
+                                                editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -87,12 +94,34 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def for_user(self, user):
+        queryset = self.defer('search_vector').prefetch_related(
+            'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')))
+        if not user.is_authenticated:
+            return queryset.select_related('author')
+        authors = User.objects.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(follower=user,
+                                        author=OuterRef('pk'))))
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        ).prefetch_related(Prefetch('author', queryset=authors))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(User, verbose_name='Автор',
                                on_delete=models.CASCADE,
                                related_name='recipes')
     name = models.CharField('Название', max_length=RECIPE_NAME_MAX_LEN)
     image = models.ImageField('Изображение', upload_to='recipes/')
+    image_renditions = models.JSONField(default=dict, blank=True)
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(Ingredient, related_name='recipes',
                                          through='RecipeIngredient')
@@ -108,11 +137,24 @@ class Recipe(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     hashcode = models.CharField(max_length=RECIPE_HASHCODE_MAX_LEN,
                                 unique=True, blank=True, null=True)
+    favorites_count = models.PositiveIntegerField('В избранном', default=0,
+                                                  editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-created_at', 'name']
+        indexes = [
+            models.Index(fields=['-created_at', 'name', 'id'],
+                         name='recipe_feed_order_idx'),
+            models.Index(fields=['-favorites_count', '-created_at', 'name',
+                                 'id'],
+                         name='recipe_popular_order_idx')]
 
     def __str__(self):
         return self.name
@@ -162,6 +204,19 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.measurement_unit}')
 
 
+class SubscriptionQuerySet(models.QuerySet):
+
+    def with_author_recipes(self, recipes_limit):
+        recipes = Recipe.objects.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('created_at').desc(), F('name').asc())
+        )).filter(row_number__lte=recipes_limit)
+        return self.select_related('author').prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='preview_recipes'))
+
+
 class Subscription(models.Model):
     follower = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -172,6 +227,8 @@ class Subscription(models.Model):
         related_name='subscribers'
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -209,3 +266,55 @@ class ShoppingCart(models.Model):
         ordering = ['user', 'recipe']
         constraints = [models.UniqueConstraint(fields=('user', 'recipe'),
                                                name='unique_shopping_cart')]
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list_items')
+    ingredient = models.ForeignKey(Ingredient, verbose_name='Ингредиент',
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_list_items')
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        ordering = ['user', 'ingredient']
+        constraints = [models.UniqueConstraint(
+            fields=('user', 'ingredient'), name='unique_shopping_list_item')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.amount}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='similar_recipes',
+                               db_index=False)
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                related_name='similar_to')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ['recipe', '-score']
+        indexes = [models.Index(fields=['recipe', '-score'],
+                                name='similar_recipe_order_idx')]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
+
+
+class PantryChange(models.Model):
+    recipe_ids = models.JSONField('Рецепты', null=True)
+    created_at = models.DateTimeField('Дата изменения', auto_now_add=True,
+                                      db_index=True)
+
+    class Meta:
+        verbose_name = 'Изменение индекса продуктов'
+        verbose_name_plural = 'Изменения индекса продуктов'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.pk}: {self.recipe_ids}'
@@ -1,5 +1,13 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from .constants import PAGE_SIZE
 
@@ -13,3 +21,110 @@ class CustomPagination(PageNumberPagination):
                          'next': self.get_next_link(),
                          'previous': self.get_previous_link(),
                          'results': data})
+
+
+class RecipePagination(CustomPagination):
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    orderings = (('-created_at', 'name', 'id'),
+                 ('-favorites_count', '-created_at', 'name', 'id'))
+    invalid_cursor_message = 'Неверный курсор.'
+    invalid_ordering_message = ('Курсорная пагинация недоступна для '
+                                'выбранного порядка рецептов.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.model = queryset.model
+        self.keyset = tuple(queryset.query.order_by) or self.orderings[0]
+        if self.keyset not in self.orderings:
+            raise ValidationError(
+                {self.cursor_query_param: [self.invalid_ordering_message]})
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+
+        ordering = self.keyset
+        if reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._keyset_filter(position, reverse))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({'count': self.count,
+                         'next': self.get_next_link(),
+                         'previous': self.get_previous_link(),
+                         'results': data})
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not (self.has_next and self.results):
+            return None
+        return self.encode_cursor(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not (self.has_previous and self.results):
+            return None
+        return self.encode_cursor(self.results[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        position = []
+        for field in self.keyset:
+            value = getattr(obj, field.lstrip('-'))
+            position.append(value.isoformat()
+                            if isinstance(value, datetime) else value)
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            {'p': position, 'r': reverse}).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(data['p']) != len(self.keyset):
+                raise ValueError
+            return (tuple(
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.keyset, data['p'])),
+                bool(data['r']))
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _keyset_filter(self, position, reverse):
+        condition, equal = Q(), Q()
+        for field, value in zip(self.keyset, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
@@ -0,0 +1,240 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .constants import PANTRY_INDEX_CHUNK_SIZE, PANTRY_INDEX_MAX_CHANGES
+from .models import PantryChange, RecipeIngredient
+
+popcount = getattr(int, 'bit_count', lambda bits: bin(bits).count('1'))
+
+
+def publish_changes(recipe_ids):
+    PantryChange.objects.create(recipe_ids=recipe_ids)
+
+
+def get_sequence():
+    return PantryChange.objects.aggregate(sequence=Max('id'))['sequence'] or 0
+
+
+def prune_changes(sequence):
+    # An index older than PANTRY_INDEX_TTL is rebuilt, so no process still
+    # needs changes from before twice that; the latest change is kept so
+    # the sequence never goes back.
+    PantryChange.objects.filter(
+        id__lt=sequence, created_at__lt=timezone.now()
+        - timedelta(seconds=settings.PANTRY_INDEX_TTL * 2)).delete()
+
+
+def to_bitset(positions):
+    if isinstance(positions, int):
+        return positions
+    if not positions:
+        return 0
+    buffer = bytearray(positions[-1] // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_positions(bits):
+    while bits:
+        position = bits.bit_length() - 1
+        yield position
+        bits ^= 1 << position
+
+
+class PantryMatches:
+
+    def __init__(self, recipe_ids, bitsets, size_masks):
+        self.recipe_ids = recipe_ids
+        self.size_masks = sorted(size_masks.items())
+        self.have_max = len(bitsets)
+        self.planes = []
+        self.union = 0
+        for bits in bitsets:
+            self.union |= bits
+            for level, plane in enumerate(self.planes):
+                self.planes[level], bits = plane ^ bits, plane & bits
+                if not bits:
+                    break
+            else:
+                self.planes.append(bits)
+        self.count = popcount(self.union)
+
+    def __len__(self):
+        return self.count
+
+    def groups(self):
+        for have in range(min(self.have_max, (1 << len(self.planes)) - 1),
+                          0, -1):
+            mask = self.union
+            for level, plane in enumerate(self.planes):
+                mask &= plane if have >> level & 1 else ~plane
+            if not mask:
+                continue
+            for size, size_mask in self.size_masks:
+                group = mask & size_mask
+                if group:
+                    yield have, size - have, group
+
+    def __getitem__(self, page):
+        skip, left = page.start or 0, page.stop - (page.start or 0)
+        results = []
+        for have, missing, group in self.groups():
+            if left <= 0:
+                break
+            count = popcount(group)
+            if skip >= count:
+                skip -= count
+                continue
+            for index, position in enumerate(iter_positions(group)):
+                if index < skip:
+                    continue
+                if left <= 0:
+                    break
+                results.append((self.recipe_ids[position], have, missing))
+                left -= 1
+            skip = 0
+        return results
+
+
+class PantryIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recipe_ids = array('q')
+        self._postings = {}
+        self._size_masks = {}
+        self._sequence = None
+        self._built_at = None
+
+    def mark_changed(self, recipe_ids=None):
+        transaction.on_commit(partial(
+            publish_changes, None if recipe_ids is None else list(recipe_ids)))
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _is_stale(self):
+        return (self._built_at is None
+                or time.monotonic() - self._built_at
+                > settings.PANTRY_INDEX_TTL)
+
+    def _build(self, sequence):
+        recipe_ids = array('q')
+        postings = defaultdict(list)
+        sizes = defaultdict(bytearray)
+        current, size = None, 0
+        rows = RecipeIngredient.objects.order_by('recipe_id').values_list(
+            'recipe_id', 'ingredient_id').iterator(
+                chunk_size=PANTRY_INDEX_CHUNK_SIZE)
+        for recipe_id, ingredient_id in rows:
+            if recipe_id != current:
+                if current is not None:
+                    self._mark_size(sizes, size, len(recipe_ids) - 1)
+                current, size = recipe_id, 0
+                recipe_ids.append(recipe_id)
+            postings[ingredient_id].append(len(recipe_ids) - 1)
+            size += 1
+        if current is not None:
+            self._mark_size(sizes, size, len(recipe_ids) - 1)
+        dense = len(recipe_ids) // 32
+        self._recipe_ids = recipe_ids
+        self._postings = {
+            ingredient_id: (to_bitset(positions) if len(positions) > dense
+                            else array('l', positions))
+            for ingredient_id, positions in postings.items()}
+        self._size_masks = {size: int.from_bytes(buffer, 'little')
+                            for size, buffer in sizes.items()}
+        self._sequence = sequence
+        self._built_at = time.monotonic()
+        prune_changes(sequence)
+
+    @staticmethod
+    def _mark_size(sizes, size, position):
+        buffer = sizes[size]
+        if len(buffer) <= position >> 3:
+            buffer.extend(bytes((position >> 3) + 1 - len(buffer)))
+        buffer[position >> 3] |= 1 << (position & 7)
+
+    def _refresh(self, recipe_ids):
+        rows = defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id',
+                                                      'ingredient_id'):
+            rows[recipe_id].append(ingredient_id)
+        positions, stale = {}, []
+        for recipe_id in sorted(recipe_ids):
+            position = bisect_left(self._recipe_ids, recipe_id)
+            if (position < len(self._recipe_ids)
+                    and self._recipe_ids[position] == recipe_id):
+                positions[recipe_id] = position
+                stale.append(position)
+            elif recipe_id in rows:
+                if position < len(self._recipe_ids):
+                    return False
+                positions[recipe_id] = len(self._recipe_ids)
+                self._recipe_ids.append(recipe_id)
+        if stale:
+            keep = ~sum(1 << position for position in stale)
+            for ingredient_id, posting in self._postings.items():
+                if isinstance(posting, int):
+                    self._postings[ingredient_id] = posting & keep
+                    continue
+                for position in stale:
+                    index = bisect_left(posting, position)
+                    if index < len(posting) and posting[index] == position:
+                        del posting[index]
+            for size, size_mask in self._size_masks.items():
+                self._size_masks[size] = size_mask & keep
+        for recipe_id, ingredient_ids in rows.items():
+            position = positions[recipe_id]
+            for ingredient_id in ingredient_ids:
+                posting = self._postings.setdefault(ingredient_id,
+                                                    array('l'))
+                if isinstance(posting, int):
+                    self._postings[ingredient_id] = posting | 1 << position
+                else:
+                    insort(posting, position)
+            self._size_masks[len(ingredient_ids)] = (
+                self._size_masks.get(len(ingredient_ids), 0) | 1 << position)
+        return True
+
+    def _sync(self):
+        sequence = get_sequence()
+        if (self._is_stale() or sequence < self._sequence
+                or sequence - self._sequence > PANTRY_INDEX_MAX_CHANGES):
+            return self._build(sequence)
+        if sequence == self._sequence:
+            return
+        changes = list(PantryChange.objects.filter(
+            id__gt=self._sequence, id__lte=sequence).values_list(
+                'recipe_ids', flat=True))
+        if (None in changes
+                or not self._refresh({recipe_id for recipe_ids in changes
+                                      for recipe_id in recipe_ids})):
+            return self._build(sequence)
+        self._sequence = sequence
+
+    def match(self, ingredient_ids):
+        with self._lock:
+            self._sync()
+            return PantryMatches(
+                self._recipe_ids,
+                [to_bitset(self._postings[ingredient_id])
+                 for ingredient_id in set(ingredient_ids)
+                 if ingredient_id in self._postings],
+                dict(self._size_masks))
+
+
+pantry_index = PantryIndex()
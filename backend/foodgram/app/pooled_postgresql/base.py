@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+Database = base.Database
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+
+    def __init__(self, max_size=10, max_lifetime=1800, timeout=30,
+                 check=True):
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check = check
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.born = {}
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.recycled = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def expired(self, connection):
+        return (self.max_lifetime is not None
+                and time.monotonic() - self.born[connection]
+                >= self.max_lifetime)
+
+    def discard(self, connection):
+        del self.born[connection]
+        self.recycled += 1
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+    def is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            while True:
+                while self.idle:
+                    connection = self.idle.pop()
+                    if not self.expired(connection):
+                        self.in_use += 1
+                        return connection
+                    self.discard(connection)
+                if self.in_use < self.max_size:
+                    self.in_use += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise Database.OperationalError(
+                        f'Нет свободных соединений в пуле за '
+                        f'{self.timeout} с (размер пула {self.max_size}).')
+                self.waiting += 1
+                waited = time.monotonic()
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    self.wait_time += time.monotonic() - waited
+
+    def getconn(self, connect):
+        while True:
+            connection = self.checkout()
+            if connection is None:
+                break
+            if not self.check or self.is_usable(connection):
+                return connection
+            self.putconn(connection, close=True)
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.born[connection] = time.monotonic()
+            self.created += 1
+        return connection
+
+    def putconn(self, connection, close=False):
+        if not (close or connection.closed) and (
+                connection.info.transaction_status
+                != TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except Database.Error:
+                close = True
+        with self.condition:
+            self.in_use -= 1
+            if close or connection.closed or self.expired(connection):
+                self.discard(connection)
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'size': self.in_use + len(self.idle),
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                'created': self.created,
+                'recycled': self.recycled,
+                'timeouts': self.timeouts,
+                'wait_time_ms': round(self.wait_time * 1000, 1),
+            }
+
+
+def get_pool(alias, name, options):
+    key = (os.getpid(), alias, name)
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(**options)
+        return pools[key]
+
+
+def get_pool_stats():
+    with pools_lock:
+        current = [(alias, pool) for (pid, alias, name), pool
+                   in pools.items() if pid == os.getpid()]
+    return {alias: pool.stats() for alias, pool in current}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['NAME'],
+                        self.settings_dict['OPTIONS'].get('pool', {}))
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        return self.pool.getconn(
+            partial(super().get_new_connection, conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection,
+                                  close=self.in_atomic_block)
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
+
+from .models import Favorite, Recipe, ShoppingCart
+from .shopping_list import (add_recipes_to_shopping_list,
+                            remove_recipes_from_shopping_list,
+                            touch_shopping_carts)
+
+User = get_user_model()
+
+ADDED, REMOVED = 'added', 'removed'
+ALREADY_ADDED, NOT_ADDED, NOT_FOUND = 'already_added', 'not_added', 'not_found'
+
+
+class RecipeList:
+
+    def __init__(self, model, counter_field):
+        self.model = model
+        self.counter_field = counter_field
+
+    def lock(self, user_ids):
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list('pk'))
+
+    def on_added(self, user, recipe_ids):
+        pass
+
+    def on_removed(self, user, recipe_ids):
+        pass
+
+    def on_cleared(self, user):
+        pass
+
+    def on_discarded(self, recipe_id, user_ids):
+        pass
+
+    def entries(self, user, recipe_ids=None):
+        entries = self.model.objects.filter(user=user)
+        if recipe_ids is not None:
+            entries = entries.filter(recipe_id__in=recipe_ids)
+        return entries
+
+    def lookup(self, user, recipe_ids):
+        return dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            listed=Exists(self.entries(user).filter(recipe=OuterRef('pk')))
+        ).values_list('pk', 'listed'))
+
+    def shift_counters(self, recipe_ids, delta):
+        Recipe.objects.filter(pk__in=recipe_ids).update(**{
+            self.counter_field: Greatest(F(self.counter_field) + delta, 0)})
+
+    @transaction.atomic
+    def add(self, user, recipe_ids):
+        self.lock([user.pk])
+        listed = self.lookup(user, recipe_ids)
+        added = [pk for pk in recipe_ids if listed.get(pk) is False]
+        self.model.objects.bulk_create(
+            [self.model(user=user, recipe_id=pk) for pk in added],
+            ignore_conflicts=True)
+        if added:
+            self.shift_counters(added, 1)
+            self.on_added(user, added)
+        return {pk: (NOT_FOUND if pk not in listed
+                     else ALREADY_ADDED if listed[pk] else ADDED)
+                for pk in recipe_ids}
+
+    @transaction.atomic
+    def remove(self, user, recipe_ids):
+        self.lock([user.pk])
+        listed = self.lookup(user, recipe_ids)
+        removed = [pk for pk in recipe_ids if listed.get(pk)]
+        if removed:
+            self.on_removed(user, removed)
+            self.shift_counters(removed, -1)
+            self.entries(user, removed).delete()
+        return {pk: (NOT_FOUND if pk not in listed
+                     else REMOVED if listed[pk] else NOT_ADDED)
+                for pk in recipe_ids}
+
+    @transaction.atomic
+    def clear(self, user):
+        self.lock([user.pk])
+        recipes = Recipe.objects.filter(
+            pk__in=self.entries(user).values('recipe'))
+        self.on_cleared(user)
+        recipes.update(**{self.counter_field: Greatest(
+            F(self.counter_field) - 1, 0)})
+        self.entries(user).delete()
+
+    @transaction.atomic
+    def discard_recipe(self, recipe_id):
+        entries = self.model.objects.filter(recipe_id=recipe_id)
+        self.lock(entries.values('user'))
+        self.on_discarded(recipe_id,
+                          list(entries.values_list('user', flat=True)))
+        entries.delete()
+
+
+class ShoppingCartList(RecipeList):
+
+    def lock(self, user_ids):
+        touch_shopping_carts(user_ids)
+
+    def on_added(self, user, recipe_ids):
+        add_recipes_to_shopping_list(user.pk, recipe_ids)
+
+    def on_removed(self, user, recipe_ids):
+        remove_recipes_from_shopping_list(user.pk, recipe_ids)
+
+    def on_cleared(self, user):
+        user.shopping_list_items.all().delete()
+
+    def on_discarded(self, recipe_id, user_ids):
+        for user_id in user_ids:
+            remove_recipes_from_shopping_list(user_id, [recipe_id])
+
+
+favorites = RecipeList(Favorite, 'favorites_count')
+shopping_cart = ShoppingCartList(ShoppingCart, 'shopping_cart_count')
@@ -0,0 +1,72 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .constants import RENDITION_MAX_SIZE, RENDITION_QUALITY
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions')
+    return _executor
+
+
+def render(image, size, image_format):
+    image = image.copy()
+    if size:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        image.thumbnail(RENDITION_MAX_SIZE, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def build_renditions(model, pk, field_name, name, renditions):
+    try:
+        field = model._meta.get_field(field_name)
+        storage, upload_to = field.storage, field.upload_to
+        with storage.open(name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            paths = {'source': name}
+            for key, (size, image_format) in renditions.items():
+                content = render(image, size, image_format)
+                digest = hashlib.sha256(content).hexdigest()[:20]
+                extension = 'jpg' if image_format == 'JPEG' else 'webp'
+                path = f'{upload_to}renditions/{digest}.{extension}'
+                if not storage.exists(path):
+                    path = storage.save(path, ContentFile(content))
+                paths[key] = path
+        model.objects.filter(pk=pk, **{field_name: name}).update(
+            **{f'{field_name}_renditions': paths})
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(instance, field_name, renditions):
+    name = getattr(instance, field_name).name
+    stored = getattr(instance, f'{field_name}_renditions') or {}
+    if not name or stored.get('source') == name:
+        return
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: get_executor().submit(
+        build_renditions, model, pk, field_name, name, renditions))
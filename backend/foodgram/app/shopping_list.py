@@ -0,0 +1,122 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .constants import SHOPPING_LIST_CHUNK_SIZE
+from .models import RecipeIngredient, ShoppingListItem
+
+User = get_user_model()
+
+SHOPPING_LIST_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(user):
+    return (ShoppingListItem.objects.filter(user=user)
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    total_amount=F('amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit'))
+
+
+def get_live_totals(user_ids):
+    return (RecipeIngredient.objects
+            .filter(recipe__in_shopping_cart__user__in=user_ids)
+            .values('recipe__in_shopping_cart__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .values_list('recipe__in_shopping_cart__user', 'ingredient',
+                         'total')
+            .order_by())
+
+
+def touch_shopping_carts(user_ids):
+    User.objects.filter(pk__in=user_ids).update(
+        shopping_cart_updated_at=timezone.now())
+
+
+def recipes_amount(recipe_ids):
+    return Subquery(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids, ingredient=OuterRef('ingredient')
+    ).values('ingredient').annotate(total=Sum('amount')).values('total'))
+
+
+def add_recipes_to_shopping_list(user_id, recipe_ids):
+    amounts = dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient').annotate(total=Sum('amount')).values_list(
+        'ingredient', 'total').order_by())
+    items = ShoppingListItem.objects.filter(user_id=user_id,
+                                            ingredient_id__in=amounts)
+    existing = set(items.values_list('ingredient_id', flat=True))
+    if existing:
+        items.update(amount=F('amount') + recipes_amount(recipe_ids))
+    ShoppingListItem.objects.bulk_create([
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=amount)
+        for ingredient_id, amount in amounts.items()
+        if ingredient_id not in existing
+    ])
+
+
+def remove_recipes_from_shopping_list(user_id, recipe_ids):
+    items = ShoppingListItem.objects.filter(user_id=user_id)
+    items.filter(ingredient__in=RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values('ingredient')
+    ).update(amount=Greatest(F('amount') - recipes_amount(recipe_ids), 0))
+    items.filter(amount=0).delete()
+
+
+def rebuild_shopping_lists(user_ids):
+    touch_shopping_carts(user_ids)
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          amount=total)
+         for user_id, ingredient_id, total in get_live_totals(
+             user_ids).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)),
+        batch_size=SHOPPING_LIST_CHUNK_SIZE)
+
+
+def render_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_LIST_HEADER)
+    for item in items:
+        yield writer.writerow([item['ingredient__name'],
+                               item['total_amount'],
+                               item['ingredient__measurement_unit']])
+
+
+def render_txt(items):
+    yield 'Список покупок\n\n'
+    for item in items:
+        yield (f'{item["ingredient__name"]} '
+               f'({item["ingredient__measurement_unit"]}) — '
+               f'{item["total_amount"]}\n')
+
+
+def render_json(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['total_amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'csv': (render_csv, 'text/csv'),
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'json': (render_json, 'application/json'),
+}
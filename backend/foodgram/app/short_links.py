@@ -0,0 +1,53 @@
+import string
+
+from .constants import (RECIPE_HASHCODE_MAX_LEN, SHORT_LINK_LENGTH,
+                        SHORT_LINK_MASK, SHORT_LINK_MODULUS,
+                        SHORT_LINK_MULTIPLIER)
+from .models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+SHORT_LINK_INVERSE = pow(SHORT_LINK_MULTIPLIER, -1, SHORT_LINK_MODULUS)
+
+
+def encode_recipe_id(recipe_id):
+    value = (recipe_id * SHORT_LINK_MULTIPLIER
+             % SHORT_LINK_MODULUS) ^ SHORT_LINK_MASK
+    chars = []
+    for _ in range(SHORT_LINK_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def decode_short_code(code):
+    if len(code) != SHORT_LINK_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        index = ALPHABET.find(char)
+        if index < 0:
+            return None
+        value = value * len(ALPHABET) + index
+    if value >= SHORT_LINK_MODULUS:
+        return None
+    return (value ^ SHORT_LINK_MASK) * SHORT_LINK_INVERSE % SHORT_LINK_MODULUS
+
+
+def resolve_short_code(code):
+    if len(code) == RECIPE_HASHCODE_MAX_LEN:
+        return Recipe.objects.filter(hashcode=code).values_list(
+            'id', flat=True).first()
+    recipe_id = decode_short_code(code)
+    if recipe_id and Recipe.objects.filter(id=recipe_id).exists():
+        return recipe_id
+    return None
+
+
+async def aresolve_short_code(code):
+    if len(code) == RECIPE_HASHCODE_MAX_LEN:
+        return await Recipe.objects.filter(hashcode=code).values_list(
+            'id', flat=True).afirst()
+    recipe_id = decode_short_code(code)
+    if recipe_id and await Recipe.objects.filter(id=recipe_id).aexists():
+        return recipe_id
+    return None
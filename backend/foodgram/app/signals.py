@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalogue_cache import bump_catalogue_version
+from .constants import AVATAR_RENDITIONS, RECIPE_IMAGE_RENDITIONS
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe, Tag
+from .pantry_index import pantry_index
+from .recipe_lists import favorites, shopping_cart
+from .renditions import schedule_renditions
+
+User = get_user_model()
+
+
+def shift_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def count_recipes(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete or created:
+        shift_counter(User, instance.author_id, 'recipes_count',
+                      -1 if signal is post_delete else 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_carts(sender, instance, **kwargs):
+    shopping_cart.discard_recipe(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def clear_recipe_lists(sender, instance, **kwargs):
+    favorites.clear(instance)
+    shopping_cart.clear(instance)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalogue_cache(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_pantry_index(sender, instance, **kwargs):
+    pantry_index.mark_changed([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    schedule_renditions(instance, 'image', RECIPE_IMAGE_RENDITIONS)
+
+
+@receiver(post_save, sender=User)
+def process_avatar(sender, instance, **kwargs):
+    schedule_renditions(instance, 'avatar', AVATAR_RENDITIONS)
@@ -0,0 +1,1045 @@
+import base64
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.uploads import check_pixels, decode_base64_image
+from . import async_views
+from .constants import BASE64_CHUNK_SIZE, UPLOAD_HEADER_BYTES
+from .db_router import replica_monitor
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     SimilarRecipe, Tag)
+from .pantry_index import PantryIndex, pantry_index
+from .recipe_lists import favorites, shopping_cart
+from .short_links import encode_recipe_id
+from .views import RecipeViewSet
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        password='password', first_name='Имя', last_name='Фамилия')
+
+
+def create_recipe(author, name, ingredients=(), tags=(), text='Описание'):
+    recipe = Recipe.objects.create(
+        author=author, name=name, image='recipes/test.png',
+        image_renditions={'source': 'recipes/test.png'}, text=text,
+        cooking_time=10)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for amount, ingredient in enumerate(ingredients, start=1))
+    return recipe
+
+
+def admin_form_data(response):
+    data = {}
+    form_list = [response.context['adminform'].form]
+    for inline in response.context['inline_admin_formsets']:
+        management_form = inline.formset.management_form
+        data.update({management_form.add_prefix(name): value
+                     for name, value in management_form.initial.items()})
+        form_list += inline.formset.forms
+    for form in form_list:
+        for name, field in form.fields.items():
+            value = form[name].value()
+            if value is not None and not isinstance(field, forms.FileField):
+                data[form.add_prefix(name)] = value
+    return data
+
+
+def create_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(count))
+
+
+def create_tags(count):
+    return Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', slug=f'tag{number}')
+        for number in range(count))
+
+
+class SimilarRecipesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(3)]
+        onion, carrot, beet = create_ingredients(3)
+        author = cls.users[0]
+        cls.salad = create_recipe(author, 'Салат', [onion, carrot])
+        cls.stew = create_recipe(author, 'Рагу', [onion, carrot])
+        cls.soup = create_recipe(author, 'Суп', [beet])
+        cls.borsch = create_recipe(author, 'Борщ', [beet])
+        Favorite.objects.bulk_create(
+            [Favorite(user=user, recipe=cls.borsch) for user in cls.users]
+            + [Favorite(user=user, recipe=cls.soup)
+               for user in cls.users[:2]])
+
+    def build(self, **options):
+        call_command('build_similar_recipes', stdout=StringIO(), **options)
+
+    def neighbours(self, recipe):
+        return list(SimilarRecipe.objects.filter(recipe=recipe).values_list(
+            'similar_id', 'score'))
+
+    def test_shared_ingredients_and_favorites(self):
+        self.build()
+        self.assertEqual(self.neighbours(self.salad), [(self.stew.pk, 0.6)])
+        [(similar_id, score)] = self.neighbours(self.soup)
+        self.assertEqual(similar_id, self.borsch.pk)
+        self.assertAlmostEqual(score, 0.6 + 0.4 * 2 / (2 * 3) ** 0.5,
+                               places=5)
+
+    def test_recipe_above_postings_cap_is_skipped_for_favorites(self):
+        self.build(max_postings=2)
+        self.assertEqual(self.neighbours(self.soup), [(self.borsch.pk, 0.6)])
+        self.assertEqual(self.neighbours(self.borsch), [(self.soup.pk, 0.6)])
+
+    def test_rebuild_replaces_rows(self):
+        self.build()
+        self.build(top_k=1)
+        self.assertEqual(SimilarRecipe.objects.count(), 4)
+
+    def test_endpoint_reads_one_query(self):
+        self.build()
+        client = APIClient()
+        with self.assertNumQueries(1):
+            response = client.get(f'/api/recipes/{self.soup.pk}/similar/')
+        self.assertEqual([recipe['id'] for recipe in response.json()],
+                         [self.borsch.pk])
+        self.assertEqual(
+            client.get(f'/api/recipes/{self.soup.pk + 100}/similar/')
+            .status_code, 404)
+
+
+class RecipeListActionsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.ingredients = create_ingredients(2)
+        cls.recipe = create_recipe(cls.user, 'Салат', cls.ingredients)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count, self.recipe.shopping_cart_count
+
+    def shopping_list(self):
+        return list(self.user.shopping_list_items.values_list(
+            'ingredient_id', 'amount'))
+
+    def test_favorite_add_and_remove(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counters(), (1, 0))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_shopping_cart_add_and_remove(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 1))
+        self.assertEqual(self.shopping_list(), [
+            (self.ingredients[0].pk, 1), (self.ingredients[1].pk, 2)])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertEqual(self.shopping_list(), [])
+
+    def test_missing_recipe(self):
+        url = f'/api/recipes/{self.recipe.pk + 1}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+
+class CatalogueCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_tags(2)
+        create_ingredients(2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_catalogue_answers_not_modified(self):
+        for url in ('/api/tags/', '/api/ingredients/?name=Инг'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_version_outlives_response_cache(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with mock.patch('time.time', return_value=time.time()
+                        + settings.CATALOGUE_CACHE_TIMEOUT + 1):
+            self.assertEqual(self.client.get('/api/tags/')['ETag'], etag)
+
+    def test_changes_invalidate_etags(self):
+        for url, model, change in (
+                ('/api/tags/', Tag, lambda: Tag.objects.create(
+                    name='Новый тег', slug='new')),
+                ('/api/tags/', Tag, lambda: Tag.objects.first().delete()),
+                ('/api/ingredients/', Ingredient,
+                 lambda: Ingredient.objects.create(
+                     name='Новый ингредиент', measurement_unit='г'))):
+            with self.subTest(url=url, model=model):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertEqual([item['id'] for item in response.json()],
+                                 list(model.objects.values_list('id',
+                                                                flat=True)))
+
+
+def image_data_uri(image, image_format='PNG', tail=b''):
+    buffer = BytesIO()
+    image.save(buffer, image_format)
+    return (f'data:image/{image_format.lower()};base64,'
+            + base64.b64encode(buffer.getvalue() + tail).decode())
+
+
+class Base64ImageDecodeTest(SimpleTestCase):
+
+    def test_decodes_image(self):
+        file = decode_base64_image(image_data_uri(Image.new('RGB', (4, 3))))
+        with Image.open(file) as image:
+            self.assertEqual(image.size, (4, 3))
+        self.assertEqual(file.size, file.seek(0, 2))
+
+    def test_rejects_oversized_payload(self):
+        data = image_data_uri(Image.frombytes('RGB', (64, 64),
+                                              os.urandom(64 * 64 * 3)))
+        with mock.patch('api.uploads.UPLOAD_MAX_BYTES', 1000):
+            with self.assertRaisesMessage(serializers.ValidationError,
+                                          'больше 1000 байт'):
+                decode_base64_image(data)
+
+    def test_rejects_bad_header(self):
+        for data in ('data:image/bmp;base64,AAAA', 'image/png;base64,AAAA',
+                     'data:image/png;base64,AAA',
+                     'data:image/png;base64,' + base64.b64encode(
+                         b'not an image' * 10).decode()):
+            with self.subTest(data=data[:30]):
+                with self.assertRaises(serializers.ValidationError):
+                    decode_base64_image(data)
+
+    def test_rejects_pixel_bomb_before_decoding_the_rest(self):
+        data = image_data_uri(Image.new('1', (10000, 5000)),
+                              tail=bytes(UPLOAD_HEADER_BYTES * 4))
+        with mock.patch('api.uploads.base64.b64decode',
+                        wraps=base64.b64decode) as b64decode:
+            with self.assertRaisesMessage(serializers.ValidationError,
+                                          'пикселей'):
+                decode_base64_image(data)
+        self.assertLess(b64decode.call_count * BASE64_CHUNK_SIZE,
+                        len(data) / 2)
+
+    def test_reads_dimensions_at_most_twice(self):
+        image = image_data_uri(Image.frombytes(
+            'RGB', (512, 512), os.urandom(512 * 512 * 3)))
+        unreadable = 'data:image/png;base64,' + base64.b64encode(
+            os.urandom(BASE64_CHUNK_SIZE * 16)).decode()
+        with mock.patch('api.uploads.check_pixels',
+                        wraps=check_pixels) as check:
+            decode_base64_image(image).close()
+        self.assertEqual(check.call_count, 1)
+        with mock.patch('api.uploads.check_pixels',
+                        wraps=check_pixels) as check:
+            with self.assertRaisesMessage(serializers.ValidationError,
+                                          'Не удалось прочитать'):
+                decode_base64_image(unreadable)
+        self.assertEqual(check.call_count, 2)
+
+
+class ShortLinkTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipe(create_user(0), 'Салат')
+
+    def test_redirect_allows_safe_methods(self):
+        url = f'/s/{encode_recipe_id(self.recipe.pk)}/'
+        for method in (self.client.get, self.client.head):
+            response = method(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response['Location'].endswith(
+                f'recipes/{self.recipe.pk}'))
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+    def test_async_redirect_allows_safe_methods(self):
+        factory = RequestFactory()
+        url = f'/s/{encode_recipe_id(self.recipe.pk)}/'
+        for method, status_code in ((factory.get, 302), (factory.head, 302),
+                                    (factory.post, 405)):
+            response = async_to_sync(async_views.short_link_redirect)(
+                method(url), encode_recipe_id(self.recipe.pk))
+            self.assertEqual(response.status_code, status_code)
+
+
+class ShoppingCartDownloadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.ingredients = create_ingredients(3)
+        cls.recipes = [create_recipe(cls.user, 'Салат', cls.ingredients[:2]),
+                       create_recipe(cls.user, 'Суп', cls.ingredients[:1]),
+                       create_recipe(cls.user, 'Рагу', cls.ingredients[2:])]
+        shopping_cart.add(cls.user, [recipe.pk for recipe in cls.recipes[:2]])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def download(self, file_format=None, **headers):
+        params = {} if file_format is None else {'file_format': file_format}
+        return self.client.get('/api/recipes/download_shopping_cart/',
+                               params, **headers)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_is_default(self):
+        response = self.download()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="shopping_list.csv"')
+        self.assertEqual(
+            list(csv.reader(StringIO(self.content(response)))), [
+                ['Ингредиент', 'Количество', 'Единица измерения'],
+                ['Ингредиент 0', '2', 'г'], ['Ингредиент 1', '2', 'г']])
+
+    def test_txt(self):
+        response = self.download('txt')
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        self.assertEqual(self.content(response),
+                         'Список покупок\n\n'
+                         'Ингредиент 0 (г) — 2\n'
+                         'Ингредиент 1 (г) — 2\n')
+
+    def test_json(self):
+        response = self.download('json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(self.content(response)), [
+            {'name': 'Ингредиент 0', 'amount': 2, 'measurement_unit': 'г'},
+            {'name': 'Ингредиент 1', 'amount': 2, 'measurement_unit': 'г'}])
+
+    def test_unknown_format(self):
+        response = self.download('pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(),
+                         {'detail': 'Неподдерживаемый формат файла: pdf.'})
+
+    def test_unchanged_cart_answers_not_modified(self):
+        etag = self.download('json')['ETag']
+        self.assertNotEqual(self.download('csv')['ETag'], etag)
+        response = self.download('json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        shopping_cart.add(self.user, [self.recipes[2].pk])
+        response = self.download('json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(self.content(response))), 3)
+
+
+class RecipeAdminTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password',
+            first_name='Имя', last_name='Фамилия')
+        cls.user = create_user(0)
+        cls.ingredients = create_ingredients(2)
+        cls.recipe = create_recipe(cls.user, 'Салат', cls.ingredients,
+                                   create_tags(1))
+        shopping_cart.add(cls.user, [cls.recipe.pk])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = f'/admin/app/recipe/{self.recipe.pk}/change/'
+
+    def shopping_list(self):
+        return list(self.user.shopping_list_items.values_list(
+            'ingredient_id', 'amount'))
+
+    def test_changing_ingredients_rebuilds_shopping_lists(self):
+        data = admin_form_data(self.client.get(self.url))
+        data['recipe_ingredients-0-amount'] = 5
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shopping_list(), [
+            (self.ingredients[0].pk, 5), (self.ingredients[1].pk, 2)])
+
+    def test_unchanged_ingredients_keep_shopping_lists(self):
+        self.user.refresh_from_db()
+        updated_at = self.user.shopping_cart_updated_at
+        data = admin_form_data(self.client.get(self.url))
+        data['name'] = 'Новый салат'
+        self.assertEqual(self.client.post(self.url, data).status_code, 302)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shopping_cart_updated_at, updated_at)
+
+    def test_reassigning_author_moves_recipe_count(self):
+        author = create_user(1)
+        data = admin_form_data(self.client.get(self.url))
+        data['author'] = author.pk
+        self.assertEqual(self.client.post(self.url, data).status_code, 302)
+        self.assertEqual(
+            dict(User.objects.filter(pk__in=[self.user.pk, author.pk])
+                 .values_list('pk', 'recipes_count')),
+            {self.user.pk: 0, author.pk: 1})
+
+
+class RecipeListOwnershipTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password',
+            first_name='Имя', last_name='Фамилия')
+        cls.author, cls.user = create_user(0), create_user(1)
+        cls.ingredients = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(cls.author, f'Рецепт {number}', cls.ingredients)
+            for number in range(2)]
+
+    def counters(self):
+        return list(Recipe.objects.order_by('pk').values_list(
+            'favorites_count', 'shopping_cart_count'))
+
+    def shopping_list(self, user):
+        return list(user.shopping_list_items.values_list(
+            'ingredient_id', 'amount'))
+
+    def add_everything(self, user):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        favorites.add(user, recipe_ids)
+        shopping_cart.add(user, recipe_ids)
+
+    def test_bulk_endpoints_and_clear(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            client.post(url, {'recipes': recipe_ids}, format='json')
+        self.assertEqual(self.counters(), [(1, 1), (1, 1)])
+        self.assertEqual(self.shopping_list(self.user), [
+            (self.ingredients[0].pk, 2), (self.ingredients[1].pk, 4)])
+        client.delete('/api/recipes/favorite/',
+                      {'recipes': recipe_ids[:1]}, format='json')
+        client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(self.counters(), [(0, 0), (1, 0)])
+        self.assertEqual(self.shopping_list(self.user), [])
+
+    def test_deleting_recipe_updates_shopping_lists(self):
+        self.add_everything(self.user)
+        self.recipes[0].delete()
+        self.assertEqual(self.shopping_list(self.user), [
+            (self.ingredients[0].pk, 1), (self.ingredients[1].pk, 2)])
+
+    def test_deleting_user_updates_counters(self):
+        self.add_everything(self.user)
+        self.add_everything(self.admin)
+        self.user.delete()
+        self.assertEqual(self.counters(), [(1, 1), (1, 1)])
+
+    def test_admin_add_and_delete(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/app/favorite/add/', {
+            'user': self.user.pk, 'recipe': self.recipes[0].pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(), [(1, 0), (0, 0)])
+        self.add_everything(self.user)
+        response = self.client.post('/admin/app/shoppingcart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(self.user.shopping_cart.values_list(
+                'pk', flat=True))})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(), [(1, 0), (1, 0)])
+        self.assertEqual(self.shopping_list(self.user), [])
+        entry = self.user.favorites.get(recipe=self.recipes[1])
+        self.client.post(f'/admin/app/favorite/{entry.pk}/delete/',
+                         {'post': 'yes'})
+        self.assertEqual(self.counters(), [(1, 0), (0, 0)])
+
+
+class RecipeQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(5)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(10)
+        cls.recipes = [
+            create_recipe(cls.users[number % 5], f'Рецепт {number}',
+                          ingredients[number % 5:number % 5 + 4],
+                          tags[:number % 3 + 1])
+            for number in range(60)]
+        cls.user = cls.users[0]
+        recipe_ids = [recipe.pk for recipe in cls.recipes[::3]]
+        favorites.add(cls.user, recipe_ids)
+        shopping_cart.add(cls.user, recipe_ids[:5])
+        cls.user.subscriptions.create(author=cls.users[1])
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for user, queries in ((None, 4), (self.user, 6)):
+            client = self.client_for(user)
+            for limit in (1, 6, 50):
+                with self.subTest(user=user, limit=limit):
+                    with self.assertNumQueries(queries):
+                        response = client.get(f'/api/recipes/?limit={limit}')
+                    self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve_queries(self):
+        recipe = self.recipes[3]
+        for user, queries in ((None, 3), (self.user, 5)):
+            client = self.client_for(user)
+            with self.subTest(user=user):
+                with self.assertNumQueries(queries):
+                    response = client.get(f'/api/recipes/{recipe.pk}/')
+                data = response.json()
+                self.assertEqual(len(data['ingredients']), 4)
+                self.assertEqual(data['is_favorited'], user is not None)
+
+
+class AuthorRecipesSerializer(serializers.ModelSerializer):
+    author_recipes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'author_recipes')
+
+    def get_author_recipes(self, recipe):
+        return Recipe.objects.filter(author_id=recipe.author_id).count()
+
+
+@override_settings(
+    MIDDLEWARE=['app.middleware.RequestInstrumentationMiddleware',
+                *settings.MIDDLEWARE],
+    N_PLUS_ONE_THRESHOLD=1, SLOW_REQUEST_MS=60000)
+class RequestInstrumentationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ingredients = create_ingredients(3)
+        for number in range(10):
+            create_recipe(create_user(number), f'Рецепт {number}',
+                          ingredients)
+
+    def test_serialization_is_timed_without_queries(self):
+        with self.assertLogs('foodgram.requests', 'WARNING') as logs:
+            response = self.client.get('/api/recipes/')
+        timings = dict(re.findall(r'(\w+);dur=([\d.]+)',
+                                  response['Server-Timing']))
+        self.assertGreater(float(timings['serialize']), 0)
+        phases = {json.loads(record.getMessage())['phase']
+                  for record in logs.records}
+        self.assertEqual(phases, {'view'})
+
+    def test_n_plus_one_names_serializer_field(self):
+        with mock.patch.object(RecipeViewSet, 'serializer_class',
+                               AuthorRecipesSerializer):
+            with self.assertLogs('foodgram.requests', 'WARNING') as logs:
+                self.client.get('/api/recipes/')
+        entries = [json.loads(record.getMessage())
+                   for record in logs.records]
+        self.assertEqual(
+            {entry['field'] for entry in entries
+             if entry['phase'] == 'serialization'},
+            {'AuthorRecipesSerializer.author_recipes'})
+        self.assertEqual(
+            {entry['field'] for entry in entries
+             if entry['phase'] == 'view'}, {None})
+
+
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        tags = create_tags(2)
+        ingredients = create_ingredients(3)
+        recipes = [create_recipe(cls.user, f'Рецепт {number}', ingredients,
+                                 tags) for number in range(5)]
+        favorites.add(cls.user, [recipes[0].pk])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def assertSameResponse(self, async_view, path, token=None, **kwargs):
+        headers = {}
+        if token is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Token {token}'
+        expected = self.client.get(path, **headers)
+        response = async_to_sync(async_view)(
+            RequestFactory().get(path, **headers), **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response.get('WWW-Authenticate'),
+                         expected.get('WWW-Authenticate'))
+        return expected
+
+    def test_recipe_list_matches_sync_view(self):
+        for path, token in (
+                ('/api/recipes/?limit=2&page=2', self.token.key),
+                ('/api/recipes/?limit=2&page=3', None),
+                ('/api/recipes/?limit=2&page=9', None),
+                ('/api/recipes/?limit=2', 'invalid'),
+                ('/api/recipes/?tags=tag0&is_favorited=1', self.token.key)):
+            with self.subTest(path=path, token=token):
+                self.assertSameResponse(async_views.recipe_list, path, token)
+        expected = self.assertSameResponse(
+            async_views.recipe_list, '/api/recipes/?cursor=&limit=2')
+        self.assertSameResponse(async_views.recipe_list,
+                                expected.json()['next'])
+
+    def test_detail_and_catalogue_match_sync_views(self):
+        recipe = Recipe.objects.first()
+        tag = Tag.objects.first()
+        for async_view, path, kwargs in (
+                (async_views.recipe_detail, f'/api/recipes/{recipe.pk}/',
+                 {'pk': recipe.pk}),
+                (async_views.recipe_detail, '/api/recipes/0/', {'pk': 0}),
+                (async_views.tag_list, '/api/tags/', {}),
+                (async_views.tag_detail, f'/api/tags/{tag.pk}/',
+                 {'pk': tag.pk}),
+                (async_views.ingredient_list, '/api/ingredients/?name=Ин',
+                 {})):
+            with self.subTest(path=path):
+                self.assertSameResponse(async_view, path, self.token.key,
+                                        **kwargs)
+
+
+class RecipeCursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(0)
+        recipes = [create_recipe(author, name) for name in (
+            'Борщ', 'Щи', 'Борщ', 'Солянка', 'Уха', 'Борщ', 'Рассольник')]
+        created_at = recipes[0].created_at
+        for number, recipe in enumerate(recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created_at=created_at - timedelta(days=number // 3))
+        cls.feed = list(Recipe.objects.order_by(
+            '-created_at', 'name', 'id').values_list('id', flat=True))
+
+    def ids(self, response):
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(self.ids(response))
+            url = response.json()[link]
+        return pages, response
+
+    def test_forward_and_back_across_equal_created_at(self):
+        pages, last = self.walk('/api/recipes/?cursor=&limit=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.feed)
+        pages, _ = self.walk(last.json()['previous'], 'previous')
+        self.assertEqual(sum(reversed(pages), []), self.feed[:6])
+
+    def test_popular_ordering_is_kept(self):
+        for count, recipe_id in zip((2, 5, 2, 0, 5), self.feed[::-1]):
+            Recipe.objects.filter(pk=recipe_id).update(favorites_count=count)
+        popular = self.ids(self.client.get(
+            '/api/recipes/?ordering=popular&limit=10'))
+        self.assertNotEqual(popular, self.feed)
+        pages, last = self.walk(
+            '/api/recipes/?ordering=popular&cursor=&limit=2', 'next')
+        self.assertEqual(sum(pages, []), popular)
+        pages, _ = self.walk(last.json()['previous'], 'previous')
+        self.assertEqual(sum(reversed(pages), []), popular[:6])
+
+    def test_count_is_opt_in(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=3')
+        self.assertIsNone(response.json()['count'])
+        response = self.client.get('/api/recipes/?cursor=&limit=3&count=true')
+        self.assertEqual(response.json()['count'], len(self.feed))
+
+    def test_invalid_cursor(self):
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for cursor in ('garbage', encode([1, 2]), encode({'r': False}),
+                       encode({'p': ['2024-01-01T00:00:00', 'Щи'],
+                               'r': False}),
+                       encode({'p': ['вчера', 'Щи', 1], 'r': False}),
+                       encode({'p': ['2024-01-01T00:00:00', 'Щи', 'x'],
+                               'r': False})):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/recipes/',
+                                           {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class RecipeSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(0)
+        cls.mushroom_soup = create_recipe(author, 'Суп грибной')
+        cls.soup = create_recipe(author, 'Суп', text='С грибами')
+        cls.vegetable_soup = create_recipe(author, 'Суп', text='Овощной')
+        cls.stew = create_recipe(author, 'Грибной суп')
+
+    def search(self, query, **params):
+        return self.client.get('/api/recipes/', {'search': query, **params})
+
+    def ids(self, response):
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    @skipUnless(connection.vendor == 'sqlite', 'iregex fallback')
+    def test_all_terms_must_match_ranked_by_name(self):
+        self.assertEqual(self.ids(self.search('ГРИБ суп')), [
+            self.stew.pk, self.mushroom_soup.pk, self.soup.pk])
+
+    def test_empty_query_returns_feed(self):
+        feed = self.ids(self.client.get('/api/recipes/'))
+        self.assertEqual(len(feed), 4)
+        for query in ('', '   '):
+            with self.subTest(query=query):
+                self.assertEqual(self.ids(self.search(query)), feed)
+
+    def test_cursor_is_rejected_for_ranked_results(self):
+        response = self.search('суп', cursor='')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+class PantrySearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(0)
+        cls.ingredients = create_ingredients(4)
+        a, b, c, d = cls.ingredients
+        cls.recipes = [create_recipe(author, f'Рецепт {number}', ingredients)
+                       for number, ingredients in enumerate(
+                           ([a, b], [a, b, c], [a], [a, c, d], [c, d]))]
+
+    def setUp(self):
+        pantry_index.invalidate()
+
+    def search(self, *ingredients, **params):
+        return self.client.get('/api/recipes/from_ingredients/', {
+            'ingredients': [ingredient.pk for ingredient in ingredients],
+            **params})
+
+    def matches(self, index, *ingredients):
+        return [(recipe_id, have, missing) for recipe_id, have, missing
+                in index.match([ingredient.pk
+                                for ingredient in ingredients])[:10]]
+
+    def test_exact_matches_first_then_fewest_missing(self):
+        a, b, c, d = self.ingredients
+        r0, r1, r2, r3, r4 = self.recipes
+        response = self.search(c, d)
+        self.assertEqual(
+            [(recipe['id'], recipe['matched_ingredients'],
+              recipe['missing_ingredients'])
+             for recipe in response.json()['results']],
+            [(r4.pk, 2, 0), (r3.pk, 2, 1), (r1.pk, 1, 2)])
+        self.assertEqual(
+            [recipe['id'] for recipe in self.search(a, b).json()['results']],
+            [r0.pk, r1.pk, r2.pk, r3.pk])
+
+    def test_pages(self):
+        a, b, _, _ = self.ingredients
+        response = self.search(a, b, limit=2, page=2)
+        data = response.json()
+        self.assertEqual(data['count'], 4)
+        self.assertEqual([recipe['id'] for recipe in data['results']],
+                         [self.recipes[2].pk, self.recipes[3].pk])
+        self.assertIsNone(data['next'])
+
+    def test_other_processes_refresh_incrementally(self):
+        a, b, c, _ = self.ingredients
+        r0, r1, r2, r3, _ = self.recipes
+        index = PantryIndex()
+        self.assertEqual(self.matches(index, a, b), [
+            (r0.pk, 2, 0), (r1.pk, 2, 1), (r2.pk, 1, 0), (r3.pk, 1, 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            created = create_recipe(r0.author, 'Новый', [b])
+            pantry_index.mark_changed([created.pk])
+            r1.recipe_ingredients.filter(ingredient=c).delete()
+            pantry_index.mark_changed([r1.pk])
+            r2.delete()
+        with mock.patch.object(index, '_build') as build:
+            self.assertEqual(self.matches(index, a, b), [
+                (r1.pk, 2, 0), (r0.pk, 2, 0), (created.pk, 1, 0),
+                (r3.pk, 1, 2)])
+        build.assert_not_called()
+
+
+class SubscriptionQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        ingredients = create_ingredients(3)
+        for number in range(25):
+            author = create_user(number)
+            for index in range(number % 4 + 1):
+                create_recipe(author, f'Рецепт {number}.{index}', ingredients)
+            cls.user.subscriptions.create(author=author)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for limit in (1, 6, 20):
+            for recipes_limit in (1, 3, 10):
+                with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                    with self.assertNumQueries(4):
+                        response = client.get('/api/users/subscriptions/', {
+                            'limit': limit, 'recipes_limit': recipes_limit})
+                    results = response.json()['results']
+                    self.assertEqual(len(results), limit)
+                    for author in results:
+                        self.assertEqual(
+                            len(author['recipes']),
+                            min(author['recipes_count'], recipes_limit))
+
+
+class RecipeUpdateWritesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(4)
+        cls.recipe = create_recipe(cls.user, 'Салат', cls.ingredients[:3],
+                                   cls.tags)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, amounts):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', {
+                    'tags': [tag.pk for tag in self.tags],
+                    'ingredients': [
+                        {'id': self.ingredients[index].pk, 'amount': amount}
+                        for index, amount in amounts.items()]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount')),
+            {self.ingredients[index].pk: amount
+             for index, amount in amounts.items()})
+        return [query['sql'].split()[0] for query in context.captured_queries
+                if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+                and '"app_recipeingredient"' in query['sql']]
+
+    def test_unchanged_ingredients_are_not_written(self):
+        self.assertEqual(self.patch({0: 1, 1: 2, 2: 3}), [])
+
+    def test_amount_change_is_one_update(self):
+        self.assertEqual(self.patch({0: 1, 1: 5, 2: 3}), ['UPDATE'])
+
+    def test_swap_is_one_delete_and_one_insert(self):
+        self.assertEqual(self.patch({1: 2, 2: 3, 3: 4}),
+                         ['DELETE', 'INSERT'])
+
+
+class RecipeCreateQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.tags = create_tags(3)
+        cls.ingredients = create_ingredients(30)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def create(self, ingredients, tags):
+        return self.client.post('/api/recipes/', {
+            'name': 'Салат', 'text': 'Описание', 'cooking_time': 10,
+            'image': image_data_uri(Image.new('RGB', (4, 4))),
+            'tags': [tag.pk for tag in tags],
+            'ingredients': [{'id': ingredient.pk, 'amount': 2}
+                            for ingredient in ingredients]}, format='json')
+
+    def test_query_count_does_not_grow_with_ingredients_and_tags(self):
+        for ingredients, tags in ((1, 1), (10, 2), (30, 3)):
+            with self.subTest(ingredients=ingredients, tags=tags):
+                with self.assertNumQueries(15):
+                    response = self.create(self.ingredients[:ingredients],
+                                           self.tags[:tags])
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['ingredients']),
+                                 ingredients)
+
+    def test_unknown_ingredient_is_reported(self):
+        missing = Ingredient(pk=self.ingredients[-1].pk + 1)
+        response = self.create([self.ingredients[0], missing], self.tags)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+
+
+class AdminQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password',
+            first_name='Имя', last_name='Фамилия')
+        users = [create_user(number) for number in range(5)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(20)
+        cls.recipes = [
+            create_recipe(users[number % 5], f'Рецепт {number}',
+                          ingredients[:number % 20 + 1], tags)
+            for number in range(30)]
+        recipe_ids = [recipe.pk for recipe in cls.recipes]
+        for user in users:
+            favorites.add(user, recipe_ids)
+            shopping_cart.add(user, recipe_ids[:10])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertPageQueries(self, url, queries):
+        self.client.get(url)
+        with self.assertNumQueries(queries):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_changelists(self):
+        # PostgreSQL reads the planner estimate before falling back to COUNT.
+        estimate = connection.vendor == 'postgresql'
+        for url, queries in (('/admin/app/recipe/', 7),
+                             ('/admin/app/favorite/', 4 + estimate),
+                             ('/admin/app/shoppingcart/', 4 + estimate)):
+            with self.subTest(url=url):
+                self.assertPageQueries(url, queries)
+
+    def test_recipe_change_page(self):
+        self.assertPageQueries(
+            f'/admin/app/recipe/{self.recipes[19].pk}/change/', 9)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+            }})[DEFAULT_DB_ALIAS]
+        call_command('migrate', database=REPLICA, verbosity=0)
+        User.objects.db_manager(REPLICA).create_user(
+            email='replica@example.com', username='replica',
+            password='password', first_name='Имя', last_name='Фамилия')
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        routing = override_settings(
+            DATABASE_ROUTERS=['app.db_router.ReplicaRouter'],
+            REPLICA_DATABASES=[REPLICA],
+            MIDDLEWARE=[*settings.MIDDLEWARE,
+                        'app.middleware.ReplicaRoutingMiddleware'])
+        routing.enable()
+        self.addCleanup(routing.disable)
+        cache.clear()
+        replica_monitor.checked.clear()
+        create_user('primary')
+        self.client = APIClient()
+
+    def usernames(self):
+        response = self.client.get('/api/users/')
+        return [user['username'] for user in response.json()['results']]
+
+    def sign_up(self, **data):
+        return self.client.post('/api/users/', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': 'Gfhjkm-2024', **data})
+
+    def test_safe_reads_use_replica(self):
+        self.assertEqual(self.usernames(), ['replica'])
+
+    def test_write_sticks_to_primary(self):
+        response = self.sign_up()
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.usernames(), ['new', 'userprimary'])
+
+    def test_failed_write_does_not_stick(self):
+        self.assertEqual(self.sign_up(email='invalid').status_code, 400)
+        self.assertEqual(self.usernames(), ['replica'])
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(
+                replica_monitor, 'lag',
+                return_value=settings.REPLICA_MAX_LAG_SECONDS + 1):
+            self.assertEqual(self.usernames(), ['userprimary'])
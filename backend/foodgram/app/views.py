@@ -1,11 +1,13 @@
-import csv
-import hashlib
-import io
+import os
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import DatabaseError, connection
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -13,21 +15,58 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from api.filters import RecipeFilter
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (FavoriteSerializer, FoodgramUserSerializer,
-                             IngredientSerializer, RecipeSerializer,
-                             RecipeShortSerializer, TagSerializer)
-from .constants import FOODGRAM_URL, RECIPE_HASHCODE_MAX_LEN
-from .models import Ingredient, Recipe, RecipeIngredient, Tag
-from .pagination import CustomPagination
+                             IngredientSerializer, PantryRecipeSerializer,
+                             PantrySerializer, RecipeIdsSerializer,
+                             RecipeSerializer, RecipeShortSerializer,
+                             TagSerializer)
+from .catalogue_cache import CatalogueCacheMixin
+from .constants import (FOODGRAM_URL, SHOPPING_LIST_CHUNK_SIZE,
+                        SHOPPING_LIST_DEFAULT_FORMAT)
+from .ingredient_index import ingredient_index
+from .middleware import SerializationTimingMixin, serialize
+from .models import Ingredient, Recipe, Tag
+from .pagination import CustomPagination, RecipePagination
+from .pantry_index import pantry_index
+from .pooled_postgresql.base import get_pool_stats
+from .recipe_lists import (ALREADY_ADDED, NOT_ADDED, NOT_FOUND, REMOVED,
+                           favorites, shopping_cart)
+from .shopping_list import SHOPPING_LIST_FORMATS, get_shopping_list
+from .short_links import encode_recipe_id, resolve_short_code
 
 User = get_user_model()
 
 
-class FoodgramUserViewSet(UserViewSet):
+@require_safe
+def short_link_redirect(request, hashcode):
+    recipe_id = resolve_short_code(hashcode)
+    if recipe_id is None:
+        raise Http404
+    return redirect(f'{FOODGRAM_URL}recipes/{recipe_id}')
+
+
+class HealthView(APIView):
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            return Response({'status': 'unavailable'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        data = {'status': 'ok'}
+        if request.user.is_staff:
+            data.update(pid=os.getpid(), pools=get_pool_stats())
+        return Response(data)
+
+
+class FoodgramUserViewSet(SerializationTimingMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = FoodgramUserSerializer
     pagination_class = CustomPagination
@@ -38,114 +77,172 @@ class FoodgramUserViewSet(UserViewSet):
         return (IsAuthenticated(),)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, SerializationTimingMixin,
+                 ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogueCacheMixin, SerializationTimingMixin,
+                        ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend,)
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, self.search, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        limit = settings.INGREDIENT_SEARCH_LIMIT if name else None
+        return Response(ingredient_index.search(name, limit))
 
 
-class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.prefetch_related('tags', 'recipe_ingredients')
+class RecipeViewSet(SerializationTimingMixin, ModelViewSet):
+    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.for_user(self.request.user)
+
     @action(detail=True, methods=['GET'], url_path='get-link')
     def get_short_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not recipe.hashcode:
-            hashcode = hashlib.md5(str(recipe.id).encode()).hexdigest()[
-                :RECIPE_HASHCODE_MAX_LEN]
-            recipe.hashcode = hashcode
-            recipe.save()
-        short_link = f'{FOODGRAM_URL}s/{recipe.hashcode}'
+        if not Recipe.objects.filter(id=pk).exists():
+            raise Http404
+        short_link = f'{FOODGRAM_URL}s/{encode_recipe_id(int(pk))}'
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['GET'], url_path='similar')
+    def similar(self, request, pk=None):
+        recipes = Recipe.objects.filter(similar_to__recipe_id=pk).order_by(
+            '-similar_to__score').only('id', 'name', 'image',
+                                       'image_renditions', 'cooking_time')
+        data = serialize(RecipeShortSerializer(
+            recipes, many=True, context=self.get_serializer_context()))
+        if not data and not Recipe.objects.filter(id=pk).exists():
+            raise Http404
+        return Response(data)
+
     @action(detail=False, methods=['GET'], url_path='s/(?P<hashcode>[^/.]+)')
     def redirect_short_link(self, request, hashcode=None):
-        recipe = get_object_or_404(Recipe, hashcode=hashcode)
-        return redirect(f'{FOODGRAM_URL}recipes/{recipe.id}')
+        return short_link_redirect(request, hashcode)
 
-    @action(detail=True, methods=['POST', 'DELETE'],
-            permission_classes=[IsAuthenticated], url_path='favorite')
-    def favorite(self, request, pk=None):
+    def update_recipe(self, request, pk, recipe_list, serializer_class,
+                      messages):
         recipe = get_object_or_404(Recipe, id=pk)
-
-        if request.method == 'DELETE':
-            favorite = request.user.favorites.filter(recipe=recipe)
-            if not favorite.exists():
-                return Response({'detail': 'Рецепта нет в избранном.'},
-                                status=status.HTTP_400_BAD_REQUEST)
-            favorite.delete()
+        update = (recipe_list.add if request.method == 'POST'
+                  else recipe_list.remove)
+        outcome = update(request.user, [recipe.pk])[recipe.pk]
+        if outcome == NOT_FOUND:
+            raise Http404
+        if outcome in messages:
+            return Response({'detail': messages[outcome]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if outcome == REMOVED:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(serialize(serializer_class(recipe)),
+                        status=status.HTTP_201_CREATED)
 
-        favorite, created = request.user.favorites.get_or_create(recipe=recipe)
-        if not created:
-            return Response({'detail': 'Рецепт уже в избранном.'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        serializer = FavoriteSerializer(recipe)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(detail=True, methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated], url_path='favorite')
+    def favorite(self, request, pk=None):
+        return self.update_recipe(request, pk, favorites, FavoriteSerializer, {
+            ALREADY_ADDED: 'Рецепт уже в избранном.',
+            NOT_ADDED: 'Рецепта нет в избранном.'})
 
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[IsAuthenticated], url_path='shopping_cart')
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        return self.update_recipe(
+            request, pk, shopping_cart, RecipeShortSerializer, {
+                ALREADY_ADDED: 'Рецепт уже в списке покупок',
+                NOT_ADDED: 'Рецепта нет в списке покупок'})
+
+    @action(detail=False, methods=['GET'], url_path='from_ingredients')
+    def from_ingredients(self, request):
+        serializer = PantrySerializer(data={
+            'ingredients': request.query_params.getlist('ingredients')})
+        serializer.is_valid(raise_exception=True)
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(
+            pantry_index.match(serializer.validated_data['ingredients']),
+            request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, matched, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_ingredients = matched
+                recipe.missing_ingredients = missing
+                results.append(recipe)
+        return paginator.get_paginated_response(serialize(
+            PantryRecipeSerializer(results, many=True,
+                                   context=self.get_serializer_context())))
+
+    def update_recipe_list(self, request, recipe_list):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        update = (recipe_list.add if request.method == 'POST'
+                  else recipe_list.remove)
+        outcomes = update(request.user, serializer.validated_data['recipes'])
+        return Response({'results': [
+            {'id': recipe_id, 'status': outcome}
+            for recipe_id, outcome in outcomes.items()
+        ]})
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated], url_path='favorite')
+    def bulk_favorite(self, request):
+        return self.update_recipe_list(request, favorites)
 
-        if request.method == 'DELETE':
-            cart_entry = request.user.shopping_cart.filter(recipe=recipe)
-            if not cart_entry.exists():
-                return Response(
-                    {'detail': 'Рецепта нет в списке покупок'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_entry.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        cart_entry, created = request.user.shopping_cart.get_or_create(
-            recipe=recipe
-        )
-        if not created:
-            return Response(
-                {'detail': 'Рецепт уже в списке покупок'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    @action(detail=False, methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated], url_path='shopping_cart')
+    def bulk_shopping_cart(self, request):
+        return self.update_recipe_list(request, shopping_cart)
 
-        serializer = RecipeShortSerializer(recipe)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=['DELETE'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart/clear')
+    def clear_shopping_cart(self, request):
+        shopping_cart.clear(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated],
             url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
-        ingredients = (RecipeIngredient.objects
-                       .filter(recipe__in_shopping_cart__user=request.user)
-                       .values('ingredient__name',
-                               'ingredient__measurement_unit')
-                       .annotate(total_amount=Sum('amount')))
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
-        for item in ingredients:
-            writer.writerow([item['ingredient__name'],
-                             item['total_amount'],
-                             item['ingredient__measurement_unit']])
-        response = HttpResponse(output.getvalue(),
-                                content_type='text/csv')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_list.csv"'
+        file_format = request.query_params.get('file_format',
+                                               SHOPPING_LIST_DEFAULT_FORMAT)
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'detail': f'Неподдерживаемый формат файла: {file_format}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+
+        etag = last_modified = response = None
+        updated_at = request.user.shopping_cart_updated_at
+        if updated_at:
+            etag = quote_etag(f'{request.user.pk}-{file_format}-'
+                              f'{int(updated_at.timestamp() * 1000000)}')
+            last_modified = int(updated_at.timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+        if response is None:
+            ingredients = get_shopping_list(request.user).iterator(
+                chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+            response = StreamingHttpResponse(render(ingredients),
+                                             content_type=content_type)
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{file_format}"')
+        if etag:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
         return response
@@ -43,6 +43,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+REQUEST_INSTRUMENTATION = os.getenv(
+    'REQUEST_INSTRUMENTATION', 'false').lower() == 'true'
+
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+if REQUEST_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'app.middleware.RequestInstrumentationMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -63,6 +73,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -70,10 +84,70 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE',
+                                      0 if ASYNC_VIEWS else 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_TRANSACTION_POOLER', 'false').lower() == 'true',
+    }
+}
+
+if os.getenv('DB_POOL', 'false').lower() == 'true':
+    DATABASES['default'].update({
+        'ENGINE': 'app.pooled_postgresql',
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {
+            'pool': {
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'max_lifetime': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                'check': os.getenv(
+                    'DB_POOL_HEALTH_CHECKS', 'true').lower() == 'true',
+            },
+        },
+    })
+
+if os.getenv('SQLITE_PATH'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH'),
+    }
+
+REPLICA_DATABASES = []
+
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica_{number}')
+
+REPLICA_STICKINESS_SECONDS = int(os.getenv('REPLICA_STICKINESS_SECONDS', 10))
+
+REPLICA_STICKY_COOKIE = 'use_primary'
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ['app.db_router.ReplicaRouter']
+    MIDDLEWARE.append('app.middleware.ReplicaRoutingMiddleware')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', 300))
+
 AUTH_USER_MODEL = 'app.FoodgramUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,6 +190,14 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'],
 }
 
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 100))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 3600))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -10,11 +10,14 @@ from api.views import (
     SubscribeView
 )
 
+from app import async_views
 from app.views import (
     FoodgramUserViewSet,
+    HealthView,
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
+    short_link_redirect,
 )
 
 router = DefaultRouter()
@@ -30,11 +33,22 @@ urlpatterns = [
     path('api/users/me/avatar/', AvatarView.as_view()),
     path('api/users/<int:author_id>/subscribe/', SubscribeView.as_view()),
     path('api/users/subscriptions/', ListMySubscriptionsView.as_view()),
+    path('api/health/', HealthView.as_view()),
     path('api/', include(router.urls)),
-    path('s/<str:hashcode>/',
-         RecipeViewSet.as_view({'get': 'redirect_short_link'})),
+    path('s/<str:hashcode>/', short_link_redirect),
 ]
 
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('api/recipes/', async_views.recipe_list),
+        path('api/recipes/<int:pk>/', async_views.recipe_detail),
+        path('api/tags/', async_views.tag_list),
+        path('api/tags/<int:pk>/', async_views.tag_detail),
+        path('api/ingredients/', async_views.ingredient_list),
+        path('api/ingredients/<int:pk>/', async_views.ingredient_detail),
+        path('s/<str:hashcode>/', async_views.short_link_redirect),
+    ] + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)